@@ -2,7 +2,7 @@ import logging
 import colorlog
 from flask import Flask, render_template
 from config import config
-from app.extensions import db, migrate, login_manager, cache, assets, csrf
+from app.extensions import db, migrate, login_manager, cache, assets, csrf, init_sqlite_foreign_keys
 
 # 新增：导入 commands 模块，用于注册 CLI 命令
 from app import commands
@@ -18,6 +18,7 @@ def create_app(config_name='default'):
 
     # 2. 初始化扩展
     db.init_app(app)
+    init_sqlite_foreign_keys(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     cache.init_app(app)
@@ -69,6 +70,8 @@ def auto_init_database(app):
                 if 'auth_users' not in tables:
                     app.logger.info('🚀 首次启动，正在创建数据库表...')
                     db.create_all()
+                    from app.commands import stamp_head
+                    stamp_head()
                     tables = []
                 user_count = 0
                 try:
@@ -284,30 +287,33 @@ def _generate_full_data(app, db):
     db.session.commit()
     
     # ========== 9. 库存数据 ==========
+    stocks = []
     for p in products:
         for w in warehouses:
             qty = random.randint(0, 500)
             if qty > 0:
-                s = Stock(product_id=p.id, warehouse_id=w.id, quantity=qty)
-                db.session.add(s)
+                stocks.append({'product_id': p.id, 'warehouse_id': w.id, 'quantity': qty})
+    db.session.execute(db.insert(Stock), stocks)
     db.session.commit()
     
     # ========== 10. 库存流水日志 (200条) ==========
     users = User.query.all()
     log_types = ['inbound', 'outbound', 'move', 'check']
-    for i in range(200):
-        log = InventoryLog(
-            transaction_code=f'LOG-{i+1:05d}',
-            move_type=random.choice(log_types),
-            product_id=random.choice(products).id,
-            warehouse_id=random.choice(warehouses).id,
-            qty_change=random.randint(-50, 100),
-            balance_after=random.randint(0, 500),
-            operator_id=random.choice(users).id,
-            remark=f'操作记录-{i+1}',
-            created_at=datetime.now() - timedelta(days=random.randint(0, 60))
-        )
-        db.session.add(log)
+    logs = [
+        {
+            'transaction_code': f'LOG-{i+1:05d}',
+            'move_type': random.choice(log_types),
+            'product_id': random.choice(products).id,
+            'warehouse_id': random.choice(warehouses).id,
+            'qty_change': random.randint(-50, 100),
+            'balance_after': random.randint(0, 500),
+            'operator_id': random.choice(users).id,
+            'remark': f'操作记录-{i+1}',
+            'created_at': datetime.now() - timedelta(days=random.randint(0, 60))
+        }
+        for i in range(200)
+    ]
+    db.session.execute(db.insert(InventoryLog), logs)
     db.session.commit()
     
     # ========== 11. 订单 (200个) ==========
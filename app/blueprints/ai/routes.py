@@ -103,7 +103,7 @@ def get_session(session_id):
         if not session:
             return jsonify({'success': False, 'error': '会话不存在'}), 404
         
-        messages = [m.to_dict() for m in session.messages.order_by(AiChatMessage.created_at.asc()).all()]
+        messages = [m.to_dict() for m in session.messages]
         
         session_dict = session.to_dict()
         session_dict['messages'] = messages
@@ -215,7 +215,8 @@ def api_chat():
         
         # 如果没有传入 context，从数据库加载历史
         if not context:
-            history = session.messages.order_by(AiChatMessage.created_at.asc()).limit(20).all()
+            history = AiChatMessage.query.filter_by(session_id=session.id)\
+                .order_by(AiChatMessage.created_at.asc()).limit(20).all()
             context = [{'role': m.role, 'content': m.content} for m in history]
         
         # 调用 AI 服务
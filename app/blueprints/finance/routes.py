@@ -294,36 +294,15 @@ def credits():
             page=page, per_page=per_page, error_out=False
         )
     elif filter_type in ['normal', 'warning']:
-        # 预警/正常需要在Python端筛选，因为is_warning是计算属性
-        all_unfrozen = query.filter(CustomerCredit.is_frozen == False).order_by(
-            CustomerCredit.used_credit.desc()
-        ).all()
-        
+        # 预警/正常在数据库中筛选并分页（is_warning 为 hybrid 属性）
+        query = query.filter(CustomerCredit.is_frozen == False)
         if filter_type == 'warning':
-            filtered_items = [c for c in all_unfrozen if c.is_warning]
+            query = query.filter(CustomerCredit.is_warning)
         else:
-            filtered_items = [c for c in all_unfrozen if not c.is_warning]
-        
-        # 手动分页
-        total = len(filtered_items)
-        start = (page - 1) * per_page
-        end = start + per_page
-        items = filtered_items[start:end]
-        
-        # 创建一个简单的分页对象
-        class SimplePagination:
-            def __init__(self, items, page, per_page, total):
-                self.items = items
-                self.page = page
-                self.per_page = per_page
-                self.total = total
-                self.pages = (total + per_page - 1) // per_page if total > 0 else 1
-                self.has_prev = page > 1
-                self.has_next = page < self.pages
-                self.prev_num = page - 1
-                self.next_num = page + 1
-        
-        credits_list = SimplePagination(items, page, per_page, total)
+            query = query.filter(db.not_(CustomerCredit.is_warning))
+        credits_list = query.order_by(CustomerCredit.used_credit.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
     else:
         # 全部
         credits_list = query.order_by(CustomerCredit.used_credit.desc()).paginate(
@@ -336,12 +315,14 @@ def credits():
         Partner.is_deleted == False
     ).scalar() or 0
     
-    # 获取所有信用记录来计算预警数量
-    all_credits = CustomerCredit.query.join(Partner).filter(
+    # 预警/正常数量一次聚合查询得出
+    warning_count, unfrozen_count = db.session.query(
+        func.count(db.case((CustomerCredit.is_warning, 1))),
+        func.count(CustomerCredit.id)
+    ).join(Partner).filter(
         Partner.is_deleted == False, CustomerCredit.is_frozen == False
-    ).all()
-    warning_count = sum(1 for c in all_credits if c.is_warning)
-    normal_count = sum(1 for c in all_credits if not c.is_warning)
+    ).one()
+    normal_count = unfrozen_count - warning_count
     
     frozen_count = CustomerCredit.query.join(Partner).filter(
         Partner.is_deleted == False,
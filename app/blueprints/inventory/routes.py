@@ -43,7 +43,7 @@ def index():
         return redirect(url_for('inventory.index'))
 
     # 处理搜索查询 - 从 URL 参数获取
-    query = Product.query
+    query = Product.query.options(db.undefer(Product.total_stock))
     search_keyword = request.args.get('q', '').strip()
     if search_keyword:
         keyword = f"%{search_keyword}%"
@@ -85,7 +85,9 @@ def export_inventory(format):
             batch_size = 100
             offset = 0
             while True:
-                products = Product.query.order_by(Product.sku.asc()).offset(offset).limit(batch_size).all()
+                products = Product.query.options(
+                    db.undefer(Product.total_stock)
+                ).order_by(Product.sku.asc()).offset(offset).limit(batch_size).all()
                 if not products:
                     break
                 for p in products:
@@ -105,7 +107,8 @@ def export_inventory(format):
         try:
             products = Product.query.options(
                 db.joinedload(Product.category),
-                db.joinedload(Product.supplier)
+                db.joinedload(Product.supplier),
+                db.undefer(Product.total_stock)
             ).order_by(Product.sku.asc()).all()
             
             data = [{
@@ -163,7 +166,9 @@ def get_barcode(sku):
 @login_required
 def view(product_id):
     """商品详情页"""
-    product = Product.query.get_or_404(product_id)
+    product = Product.query.options(
+        db.selectinload(Product.stocks).joinedload(Stock.warehouse)
+    ).get_or_404(product_id)
     
     # 库存调整表单
     adjust_form = StockAdjustmentForm()
@@ -38,8 +38,12 @@ def index():
         is_read=False
     ).count()
     
+    # 关联对象按类型批量加载，避免逐条查询
+    targets = Notification.resolve_targets(pagination.items)
+    
     return render_template('notification/index.html',
                          notifications=pagination.items,
+                         targets=targets,
                          pagination=pagination,
                          unread_count=unread_count,
                          current_category=category,
@@ -107,7 +111,8 @@ def alerts():
     alert_level = request.args.get('level', '')
     status = request.args.get('status', '')
     
-    query = StockAlert.query
+    # 模板逐行读取 alert.product，随主查询一并 JOIN 取回
+    query = StockAlert.query.options(db.joinedload(StockAlert.product))
     
     if alert_level:
         query = query.filter_by(alert_level=alert_level)
@@ -175,7 +180,10 @@ def replenishment():
     page = request.args.get('page', 1, type=int)
     status = request.args.get('status', 'pending')
     
-    query = ReplenishmentSuggestion.query.filter_by(status=status)
+    query = ReplenishmentSuggestion.query.options(
+        db.joinedload(ReplenishmentSuggestion.product),
+        db.joinedload(ReplenishmentSuggestion.warehouse),
+    ).filter_by(status=status)
     
     pagination = query.order_by(ReplenishmentSuggestion.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False
@@ -1,6 +1,7 @@
 """采购管理路由"""
 from flask import render_template, request, flash, redirect, url_for, jsonify, Response
 from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload
 from app.extensions import db
 from app.blueprints.purchase import purchase_bp
 from app.blueprints.purchase.forms import PurchaseOrderForm
@@ -23,7 +24,9 @@ def index():
     supplier_id = request.args.get('supplier_id', 0, type=int)
     export_format = request.args.get('export', '')
     
-    query = PurchaseOrder.query
+    query = PurchaseOrder.query.options(
+        selectinload(PurchaseOrder.items).joinedload(PurchaseOrderItem.product)
+    )
     
     if status:
         query = query.filter_by(status=status)
@@ -214,11 +217,18 @@ def create():
     return render_template('purchase/create.html', form=form, products=products)
 
 
+def _get_po_with_items_or_404(po_id):
+    """按 ID 获取采购单并一次性预加载明细及商品（items 禁止懒加载）"""
+    return PurchaseOrder.query.options(
+        selectinload(PurchaseOrder.items).joinedload(PurchaseOrderItem.product)
+    ).get_or_404(po_id)
+
+
 @purchase_bp.route('/<int:po_id>')
 @login_required
 def detail(po_id):
     """采购订单详情"""
-    po = PurchaseOrder.query.get_or_404(po_id)
+    po = _get_po_with_items_or_404(po_id)
     return render_template('purchase/detail.html', po=po)
 
 
@@ -276,7 +286,7 @@ def reject(po_id):
 @login_required
 def receive(po_id):
     """收货入库"""
-    po = PurchaseOrder.query.get_or_404(po_id)
+    po = _get_po_with_items_or_404(po_id)
     
     if po.status != PurchaseOrder.STATUS_APPROVED:
         flash('只有已审批的订单才能收货', 'danger')
@@ -307,6 +317,8 @@ def receive(po_id):
             return redirect(url_for('purchase.detail', po_id=po_id))
         else:
             flash(msg, 'danger')
+            # 收货失败已回滚，重新加载采购单及明细
+            po = _get_po_with_items_or_404(po_id)
     
     return render_template('purchase/receive.html', po=po)
 
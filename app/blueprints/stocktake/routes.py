@@ -66,7 +66,9 @@ def create():
             
             if not product_ids:
                 flash('抽盘请选择要盘点的商品', 'danger')
-                products = Product.query.filter_by(is_deleted=False).all()
+                products = Product.query.options(
+                    db.undefer(Product.total_stock)
+                ).filter_by(is_deleted=False).all()
                 return render_template('stocktake/create.html', form=form, products=products, preset_type=preset_type, today=today)
         
         # 获取计划日期
@@ -91,7 +93,7 @@ def create():
     from sqlalchemy.orm import joinedload
     products = Product.query.options(
         joinedload(Product.category),
-        joinedload(Product.stocks)
+        db.undefer(Product.total_stock)
     ).filter_by(is_deleted=False).limit(200).all()
     return render_template('stocktake/create.html', form=form, products=products, preset_type=preset_type, today=today)
 
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_caching import Cache
@@ -6,13 +7,49 @@ from flask_assets import Environment
 from flask_wtf.csrf import CSRFProtect
 
 # 初始化扩展对象 (暂不绑定 app)
-db = SQLAlchemy()
+# insertmanyvalues: executemany 形式的 INSERT 按页合并为多行 VALUES，减少批量写入往返
+db = SQLAlchemy(engine_options={'insertmanyvalues_page_size': 10000})
 migrate = Migrate()
 cache = Cache()
 assets = Environment()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+def init_sqlite_foreign_keys(app):
+    """
+    SQLite 默认不执行外键约束，开启后明细表的 ON DELETE CASCADE 才会生效。
+    只挂在本应用的 SQLite 引擎上，不影响进程内其他引擎。
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _enable_sqlite_foreign_keys)
+
+def evict_memoized_after_commit(*funcs):
+    """
+    登记在当前事务提交后失效的 memoize 缓存；事务回滚则丢弃登记。
+    在 flush 时就失效的话，提交前并发请求可能把未提交的旧值重新写回缓存。
+    """
+    db.session.info.setdefault('evict_memoized', set()).update(funcs)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _evict_memoized_on_commit(session):
+    for func in session.info.pop('evict_memoized', ()):
+        cache.delete_memoized(func)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_memoized_evictions(session):
+    session.info.pop('evict_memoized', None)
+
 # 配置 LoginManager
 login_manager.login_view = 'auth.login'  # 未登录跳转视图
 login_manager.login_message = 'NEXUS 安全警报：请先验证您的身份权限。'
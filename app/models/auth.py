@@ -70,6 +70,8 @@ class User(UserMixin, BaseModel):
     # 外键
     role_id = db.Column(db.Integer, db.ForeignKey('auth_roles.id'))
     department_id = db.Column(db.Integer, db.ForeignKey('auth_departments.id'))
+    
+    ai_sessions = db.relationship('AiChatSession', back_populates='user', lazy='dynamic')
 
     @property
     def password(self):
@@ -98,19 +100,31 @@ class User(UserMixin, BaseModel):
         return False
     
     def record_failed_login(self):
-        """记录登录失败"""
+        """
+        记录登录失败
+        单条 UPDATE 在数据库端自增，避免读-改-写竞争导致并发失败登录漏计
+        """
         from datetime import datetime, timedelta
-        self.failed_login_attempts += 1
-        if self.failed_login_attempts >= 5:
-            self.locked_until = datetime.utcnow() + timedelta(minutes=30)
+        attempts = db.func.coalesce(User.failed_login_attempts, 0) + 1
+        stmt = db.update(User).where(User.id == self.id).values(
+            failed_login_attempts=attempts,
+            locked_until=db.case(
+                (attempts >= 5, datetime.utcnow() + timedelta(minutes=30)),
+                else_=User.locked_until
+            )
+        ).execution_options(synchronize_session=False)
+        db.session.execute(stmt)
         db.session.commit()
     
     def reset_failed_attempts(self):
         """重置失败次数"""
         from datetime import datetime
-        self.failed_login_attempts = 0
-        self.locked_until = None
-        self.last_login = datetime.utcnow()
+        stmt = db.update(User).where(User.id == self.id).values(
+            failed_login_attempts=0,
+            locked_until=None,
+            last_login=datetime.utcnow()
+        ).execution_options(synchronize_session=False)
+        db.session.execute(stmt)
         db.session.commit()
     
     def can(self, permission):
@@ -122,17 +136,40 @@ class User(UserMixin, BaseModel):
             return True
         if self.role and self.role.is_admin:
             return True
-        if self.role:
-            for perm in self.role.permissions:
-                if perm.name == permission:
-                    return True
-        return False
+        return permission in self.permission_names
+    
+    @property
+    def permission_names(self):
+        """
+        当前角色的权限名集合，首次访问时构建并缓存在实例上，
+        之后的 can() 只需一次 O(1) 集合查找，无需重复遍历 role.permissions
+        """
+        perms = self.__dict__.get('_permission_names')
+        if perms is None:
+            perms = frozenset(p.name for p in self.role.permissions) if self.role else frozenset()
+            self.__dict__['_permission_names'] = perms
+        return perms
     
     # Flask-Login 必须属性覆盖
     @property
     def is_active(self):
         return self.is_active_user and not self.is_deleted and not self.is_locked()
 
+def _clear_permission_cache(target, *args):
+    """角色变更或实例过期/刷新后丢弃权限缓存"""
+    target.__dict__.pop('_permission_names', None)
+
+
+db.event.listen(User.role_id, 'set', _clear_permission_cache)
+db.event.listen(User, 'expire', _clear_permission_cache)
+db.event.listen(User, 'refresh', _clear_permission_cache)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    """
+    恢复会话用户：一次查询连同角色与权限加载，后续 can() 不再逐个懒加载。
+    锁定状态、角色和权限属于鉴权状态，不做进程内缓存：多 worker 下本地缓存无法跨进程失效。
+    """
+    return User.query.options(
+        db.joinedload(User.role).joinedload(Role.permissions)
+    ).filter_by(id=int(user_id)).first()
\ No newline at end of file
@@ -1,12 +1,19 @@
 from datetime import datetime
 from app.extensions import db
 
+# 金额列类型：库内以定点数精确存储和运算，读出时仍为 float，业务代码的算术保持不变
+Money = db.Numeric(18, 4, asdecimal=False)
+
+
 class BaseModel(db.Model):
     """
     NEXUS 企业级模型基类
     包含：ID主键, 创建时间, 更新时间, 软删除逻辑, 序列化方法
     """
     __abstract__ = True
+    # 所有默认值都在客户端生成，INSERT 后无需再取回服务端默认值；
+    # 明细行随父单据由数据库 ON DELETE CASCADE 删除，不校验删除行数
+    __mapper_args__ = {'eager_defaults': False, 'confirm_deleted_rows': False}
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -34,13 +41,16 @@ class BaseModel(db.Model):
         通用序列化方法：将模型转换为字典，便于 API 返回 JSON。
         过滤掉以 '_' 开头的私有属性。
         """
+        columns = type(self).__dict__.get('_dict_columns')
+        if columns is None:
+            # 列在类定义时已确定：(列名, 是否 DateTime) 每个模型类只算一次并缓存在类上
+            columns = type(self)._dict_columns = [
+                (c.name, isinstance(c.type, db.DateTime))
+                for c in self.__table__.columns
+                if not c.name.startswith('_')
+            ]
         data = {}
-        for c in self.__table__.columns:
-            if c.name.startswith('_'):
-                continue
-            val = getattr(self, c.name)
-            if isinstance(val, datetime):
-                data[c.name] = val.isoformat()
-            else:
-                data[c.name] = val
-        return data
\ No newline at end of file
+        for name, is_datetime in columns:
+            val = getattr(self, name)
+            data[name] = val.isoformat() if is_datetime and val is not None else val
+        return data
@@ -3,8 +3,8 @@ from .base import BaseModel
 
 # 多对多：产品 <-> 标签
 product_tags = db.Table('biz_product_tags',
-    db.Column('product_id', db.Integer, db.ForeignKey('biz_products.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('biz_tags.id'))
+    db.Column('product_id', db.Integer, db.ForeignKey('biz_products.id', deferrable=True, initially='IMMEDIATE')),
+    db.Column('tag_id', db.Integer, db.ForeignKey('biz_tags.id', deferrable=True, initially='IMMEDIATE'))
 )
 
 class Tag(BaseModel):
@@ -24,11 +24,15 @@ class Category(BaseModel):
 class Partner(BaseModel):
     """业务伙伴 (客户/供应商)"""
     __tablename__ = 'biz_partners'
+    __table_args__ = (
+        # 按类型筛选有效往来单位（客户/供应商下拉、财务列表）
+        db.Index('ix_biz_partners_type_is_deleted', 'type', 'is_deleted'),
+    )
     TYPE_CUSTOMER = 'customer'
     TYPE_SUPPLIER = 'supplier'
 
     name = db.Column(db.String(128), index=True)
-    type = db.Column(db.String(20), index=True) # customer/supplier
+    type = db.Column(db.String(20)) # customer/supplier
     contact_person = db.Column(db.String(64))
     phone = db.Column(db.String(32))
     email = db.Column(db.String(128))
@@ -53,14 +57,24 @@ class Product(BaseModel):
     min_stock = db.Column(db.Integer, default=10)  # 最小库存（低于预警）
     max_stock = db.Column(db.Integer, default=1000)  # 最大库存
     
-    category_id = db.Column(db.Integer, db.ForeignKey('biz_categories.id'))
-    supplier_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id')) # 默认供应商
+    category_id = db.Column(db.Integer, db.ForeignKey('biz_categories.id', deferrable=True, initially='IMMEDIATE'))
+    supplier_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id', deferrable=True, initially='IMMEDIATE')) # 默认供应商
     
     # 关系
     tags = db.relationship('Tag', secondary=product_tags, backref='products')
     supplier = db.relationship('Partner', foreign_keys=[supplier_id])
-    
-    # 动态属性：计算当前总库存 (需结合 stock 模块)
-    @property
-    def total_stock(self):
-        return sum([s.quantity for s in self.stocks])
\ No newline at end of file
+    # 分仓库存只读；需要时用 selectinload(Product.stocks) 显式预加载，总量见 total_stock
+    stocks = db.relationship('Stock', back_populates='product', viewonly=True, lazy='raise_on_sql')
+
+
+# 当前总库存：SQL 侧标量子查询聚合，避免逐个产品懒加载 stocks 集合。
+# 默认延迟加载，列表类查询用 db.undefer(Product.total_stock) 随主查询一起取回。
+from .stock import Stock
+
+Product.total_stock = db.column_property(
+    db.select(db.func.coalesce(db.func.sum(Stock.quantity), 0))
+    .where(Stock.product_id == Product.id)
+    .correlate_except(Stock)
+    .scalar_subquery(),
+    deferred=True
+)
\ No newline at end of file
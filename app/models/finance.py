@@ -1,17 +1,38 @@
 """财务相关模型 - 应收账款、收款记录"""
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql.functions import FunctionElement
 from app.extensions import db
-from .base import BaseModel
+from .base import BaseModel, Money
 from datetime import datetime, timedelta
 
 
+class days_since(FunctionElement):
+    """当前日期距给定日期的天数（SQL 侧计算，按方言编译）"""
+    type = db.Integer()
+    inherit_cache = True
+    name = 'days_since'
+
+
+@compiles(days_since)
+def _compile_days_since(element, compiler, **kw):
+    date = compiler.process(list(element.clauses)[0], **kw)
+    return "CAST(julianday(date('now', 'localtime')) - julianday(%s) AS INTEGER)" % date
+
+
+@compiles(days_since, 'postgresql')
+def _compile_days_since_pg(element, compiler, **kw):
+    return '(CURRENT_DATE - %s)' % compiler.process(list(element.clauses)[0], **kw)
+
+
 class CustomerCredit(BaseModel):
     """客户信用额度"""
     __tablename__ = 'finance_customer_credit'
     
     customer_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id'), unique=True)
     
-    credit_limit = db.Column(db.Float, default=0.0)  # 信用额度
-    used_credit = db.Column(db.Float, default=0.0)   # 已用额度
+    credit_limit = db.Column(Money, default=0.0)  # 信用额度
+    used_credit = db.Column(Money, default=0.0)   # 已用额度
     warning_threshold = db.Column(db.Float, default=80.0)  # 预警阈值百分比
     
     is_frozen = db.Column(db.Boolean, default=False)  # 是否冻结
@@ -19,6 +40,10 @@ class CustomerCredit(BaseModel):
     frozen_at = db.Column(db.DateTime)
     frozen_by = db.Column(db.Integer, db.ForeignKey('auth_users.id'))
     
+    # 乐观锁版本号：ORM 更新带 WHERE version = :v，并发修改时抛出 StaleDataError 而不是静默覆盖
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {**BaseModel.__mapper_args__, 'version_id_col': version}
+    
     customer = db.relationship('Partner')
     frozen_operator = db.relationship('User', foreign_keys=[frozen_by])
     
@@ -27,14 +52,21 @@ class CustomerCredit(BaseModel):
         """可用额度"""
         return max(0, self.credit_limit - self.used_credit)
     
-    @property
+    @hybrid_property
     def usage_rate(self):
         """使用率百分比"""
         if self.credit_limit == 0:
             return 0
         return round(self.used_credit / self.credit_limit * 100, 1)
     
-    @property
+    @usage_rate.expression
+    def usage_rate(cls):
+        return db.case(
+            (cls.credit_limit == 0, 0),
+            else_=db.func.round(cls.used_credit * 100.0 / cls.credit_limit, 1)
+        )
+    
+    @hybrid_property
     def is_warning(self):
         """是否达到预警"""
         return self.usage_rate >= self.warning_threshold
@@ -43,6 +75,15 @@ class CustomerCredit(BaseModel):
 class Receivable(BaseModel):
     """应收账款"""
     __tablename__ = 'finance_receivables'
+    __table_args__ = (
+        # 逾期扫描 / 状态列表按到期日排序
+        db.Index('ix_finance_receivables_status_due_date', 'status', 'due_date'),
+        # 单客户账龄与应收列表
+        db.Index('ix_finance_receivables_customer_id_status', 'customer_id', 'status'),
+        db.CheckConstraint('paid_amount >= 0 AND paid_amount <= total_amount', name='ck_finance_receivables_paid_range'),
+        # 欠款排行 / 按未收金额筛选
+        db.Index('ix_finance_receivables_unpaid_amount', 'unpaid_amount'),
+    )
     
     STATUS_PENDING = 'pending'      # 待收款
     STATUS_PARTIAL = 'partial'      # 部分收款
@@ -54,25 +95,24 @@ class Receivable(BaseModel):
     order_id = db.Column(db.Integer, db.ForeignKey('trade_orders.id'))
     customer_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id'))
     
-    total_amount = db.Column(db.Float)  # 应收金额
-    paid_amount = db.Column(db.Float, default=0.0)  # 已收金额
+    total_amount = db.Column(Money)  # 应收金额
+    paid_amount = db.Column(Money, default=0.0)  # 已收金额
+    # 未收金额：数据库生成列 (STORED)，可直接参与筛选、排序和索引；写入 paid_amount 后需 flush 才会刷新
+    unpaid_amount = db.Column(Money, db.Computed('total_amount - paid_amount', persisted=True))
     
     due_date = db.Column(db.Date)  # 到期日
-    status = db.Column(db.String(20), default=STATUS_PENDING, index=True)
+    status = db.Column(db.String(20), default=STATUS_PENDING)
     
     remark = db.Column(db.Text)
     
     # 关系
     order = db.relationship('Order')
     customer = db.relationship('Partner')
-    payments = db.relationship('PaymentRecord', backref='receivable', cascade='all, delete-orphan')
-    
-    @property
-    def unpaid_amount(self):
-        """未收金额"""
-        return self.total_amount - self.paid_amount
+    # 收款记录集合禁止隐式懒加载，调用方需显式 selectinload(Receivable.payments)
+    payments = db.relationship('PaymentRecord', back_populates='receivable', lazy='raise_on_sql',
+                               cascade='all, delete-orphan', passive_deletes=True)
     
-    @property
+    @hybrid_property
     def overdue_days(self):
         """逾期天数"""
         if not self.due_date or self.status == self.STATUS_PAID:
@@ -82,7 +122,16 @@ class Receivable(BaseModel):
             return (today - self.due_date).days
         return 0
     
-    @property
+    @overdue_days.expression
+    def overdue_days(cls):
+        days = days_since(cls.due_date)
+        return db.case(
+            (db.or_(cls.due_date.is_(None), cls.status == cls.STATUS_PAID), 0),
+            (days > 0, days),
+            else_=0
+        )
+    
+    @hybrid_property
     def age_bucket(self):
         """账龄分类"""
         days = self.overdue_days
@@ -96,6 +145,17 @@ class Receivable(BaseModel):
             return '61-90'
         else:
             return '90+'
+    
+    @age_bucket.expression
+    def age_bucket(cls):
+        days = cls.overdue_days
+        return db.case(
+            (days == 0, 'current'),
+            (days <= 30, '0-30'),
+            (days <= 60, '31-60'),
+            (days <= 90, '61-90'),
+            else_='90+'
+        )
 
 
 class PaymentRecord(BaseModel):
@@ -110,10 +170,10 @@ class PaymentRecord(BaseModel):
     METHOD_OTHER = 'other'
     
     payment_no = db.Column(db.String(32), unique=True, index=True)
-    receivable_id = db.Column(db.Integer, db.ForeignKey('finance_receivables.id'))
+    receivable_id = db.Column(db.Integer, db.ForeignKey('finance_receivables.id', ondelete='CASCADE'))
     customer_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id'))
     
-    amount = db.Column(db.Float)
+    amount = db.Column(Money)
     payment_method = db.Column(db.String(20), default=METHOD_BANK)
     payment_date = db.Column(db.Date, default=datetime.utcnow)
     
@@ -122,6 +182,7 @@ class PaymentRecord(BaseModel):
     
     remark = db.Column(db.Text)
     
+    receivable = db.relationship('Receivable', back_populates='payments')
     customer = db.relationship('Partner')
     operator = db.relationship('User')
 
@@ -136,10 +197,10 @@ class AccountStatement(BaseModel):
     period_start = db.Column(db.Date)
     period_end = db.Column(db.Date)
     
-    opening_balance = db.Column(db.Float, default=0.0)  # 期初余额
-    sales_amount = db.Column(db.Float, default=0.0)     # 本期销售
-    payment_amount = db.Column(db.Float, default=0.0)   # 本期收款
-    closing_balance = db.Column(db.Float, default=0.0)  # 期末余额
+    opening_balance = db.Column(Money, default=0.0)  # 期初余额
+    sales_amount = db.Column(Money, default=0.0)     # 本期销售
+    payment_amount = db.Column(Money, default=0.0)   # 本期收款
+    closing_balance = db.Column(Money, default=0.0)  # 期末余额
     
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
     generated_by = db.Column(db.Integer, db.ForeignKey('auth_users.id'))
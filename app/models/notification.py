@@ -1,4 +1,5 @@
 """通知与报表订阅模型"""
+from sqlalchemy.dialects.postgresql import JSONB
 from app.extensions import db
 from .base import BaseModel
 from datetime import datetime
@@ -7,6 +8,12 @@ from datetime import datetime
 class Notification(BaseModel):
     """系统通知"""
     __tablename__ = 'sys_notifications'
+    __table_args__ = (
+        # 未读角标计数与未读列表
+        db.Index('ix_sys_notifications_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+        # 用户最新通知（按时间倒序）
+        db.Index('ix_sys_notifications_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     TYPE_INFO = 'info'
     TYPE_WARNING = 'warning'
@@ -19,7 +26,7 @@ class Notification(BaseModel):
     CATEGORY_SYSTEM = 'system'      # 系统通知
     CATEGORY_REPORT = 'report'      # 报表通知
     
-    user_id = db.Column(db.Integer, db.ForeignKey('auth_users.id'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('auth_users.id'))
     
     title = db.Column(db.String(128))
     content = db.Column(db.Text)
@@ -39,6 +46,39 @@ class Notification(BaseModel):
     email_sent_at = db.Column(db.DateTime)
     
     user = db.relationship('User')
+    
+    @staticmethod
+    def resolve_targets(notifications):
+        """
+        批量解析通知关联对象：按 related_type 分组，每种类型一条 IN 查询。
+        返回 {(related_type, related_id): 对象}，查询次数为 O(类型数) 而非 O(通知数)。
+        """
+        from collections import defaultdict
+        from .biz import Product, Partner
+        from .trade import Order
+        from .purchase import PurchaseOrder
+        from .finance import Receivable
+        
+        type_map = {
+            'product': Product,
+            'customer': Partner,
+            'order': Order,
+            'purchase_order': PurchaseOrder,
+            'receivable': Receivable,
+            'report': GeneratedReport,
+        }
+        
+        groups = defaultdict(set)
+        for n in notifications:
+            if n.related_type in type_map and n.related_id:
+                groups[n.related_type].add(n.related_id)
+        
+        targets = {}
+        for related_type, ids in groups.items():
+            model = type_map[related_type]
+            for obj in model.query.filter(model.id.in_(ids)):
+                targets[(related_type, obj.id)] = obj
+        return targets
 
 
 class StockAlert(BaseModel):
@@ -108,6 +148,10 @@ class ReplenishmentSuggestion(BaseModel):
 class ReportSubscription(BaseModel):
     """报表订阅"""
     __tablename__ = 'report_subscriptions'
+    __table_args__ = (
+        # 定时任务按发送小时筛选到期订阅
+        db.Index('ix_report_subscriptions_is_active_send_hour_frequency', 'is_active', 'send_hour', 'frequency'),
+    )
     
     FREQUENCY_DAILY = 'daily'
     FREQUENCY_WEEKLY = 'weekly'
@@ -147,6 +191,11 @@ class ReportSubscription(BaseModel):
 class GeneratedReport(BaseModel):
     """生成的报表"""
     __tablename__ = 'generated_reports'
+    __table_args__ = (
+        # 报表内容检索（@> 包含查询），仅 PostgreSQL
+        db.Index('ix_generated_reports_report_data', 'report_data',
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     subscription_id = db.Column(db.Integer, db.ForeignKey('report_subscriptions.id'), nullable=True)
     report_type = db.Column(db.String(32))
@@ -155,8 +204,8 @@ class GeneratedReport(BaseModel):
     period_start = db.Column(db.Date)
     period_end = db.Column(db.Date)
     
-    # 报表数据 (JSON)
-    report_data = db.Column(db.JSON)
+    # 报表数据 (JSON)，PostgreSQL 上存为 JSONB：读取免重复解析，并可走 GIN 索引
+    report_data = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))
     
     # 文件路径 (PDF)
     file_path = db.Column(db.String(256))
@@ -1,12 +1,18 @@
 """采购管理模型"""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.hybrid import hybrid_property
 from app.extensions import db
-from .base import BaseModel
+from .base import BaseModel, Money
 from datetime import datetime
 
 
 class PurchaseOrder(BaseModel):
     """采购订单"""
     __tablename__ = 'purchase_orders'
+    __table_args__ = (
+        # 采购列表按供应商 + 状态筛选
+        db.Index('ix_purchase_orders_supplier_id_status', 'supplier_id', 'status'),
+    )
     
     STATUS_DRAFT = 'draft'          # 草稿
     STATUS_PENDING = 'pending'      # 待审批
@@ -20,7 +26,7 @@ class PurchaseOrder(BaseModel):
     supplier_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id'))
     warehouse_id = db.Column(db.Integer, db.ForeignKey('stock_warehouses.id'))
     
-    total_amount = db.Column(db.Float, default=0.0)
+    total_amount = db.Column(Money, default=0.0)
     status = db.Column(db.String(20), default=STATUS_DRAFT, index=True)
     
     # 审批信息
@@ -40,54 +46,97 @@ class PurchaseOrder(BaseModel):
     warehouse = db.relationship('Warehouse')
     submitter = db.relationship('User', foreign_keys=[submitted_by])
     approver = db.relationship('User', foreign_keys=[approved_by])
-    items = db.relationship('PurchaseOrderItem', backref='order', cascade='all, delete-orphan')
+    # 明细集合禁止隐式懒加载，调用方需显式 selectinload(PurchaseOrder.items)
+    items = db.relationship('PurchaseOrderItem', back_populates='order', lazy='raise_on_sql',
+                            cascade='all, delete-orphan', passive_deletes=True)
     
-    @property
+    @hybrid_property
     def received_amount(self):
         """已收货金额"""
-        return sum([item.received_qty * item.unit_price for item in self.items])
+        if 'items' in self.__dict__:
+            return sum([item.received_qty * item.unit_price for item in self.items])
+        return self.items_received_amount
     
-    @property
+    @received_amount.expression
+    def received_amount(cls):
+        return cls.items_received_amount
+    
+    @hybrid_property
     def receive_progress(self):
         """收货进度百分比"""
-        total_qty = sum([item.quantity for item in self.items])
-        received_qty = sum([item.received_qty for item in self.items])
+        if 'items' in self.__dict__:
+            total_qty = sum([item.quantity for item in self.items])
+            received_qty = sum([item.received_qty for item in self.items])
+        else:
+            total_qty = self.items_total_qty
+            received_qty = self.items_received_qty
         if total_qty == 0:
             return 0
         return round(received_qty / total_qty * 100, 1)
+    
+    @receive_progress.expression
+    def receive_progress(cls):
+        return db.case(
+            (cls.items_total_qty == 0, 0),
+            else_=db.func.round(cls.items_received_qty * 100.0 / cls.items_total_qty, 1)
+        )
 
 
 class PurchaseOrderItem(BaseModel):
     """采购订单明细"""
     __tablename__ = 'purchase_order_items'
+    __table_args__ = (
+        # 收货数量在 SQL 侧原子累加，由约束兜底防止并发收货超收
+        db.CheckConstraint('received_qty >= 0 AND received_qty <= quantity', name='ck_purchase_order_items_received_range'),
+    )
     
-    order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'))
+    order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id', ondelete='CASCADE'))
     product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id'))
     
     quantity = db.Column(db.Integer, default=1)
-    unit_price = db.Column(db.Float)  # 采购单价
+    unit_price = db.Column(Money)  # 采购单价
     received_qty = db.Column(db.Integer, default=0)  # 已收货数量
+    # 待收货数量：数据库生成列 (STORED)；修改 received_qty 后需 flush 才会刷新
+    pending_qty = db.Column(db.Integer, db.Computed('quantity - received_qty', persisted=True))
     
+    order = db.relationship('PurchaseOrder', back_populates='items')
     product = db.relationship('Product')
     
     @property
     def subtotal(self):
         return self.quantity * self.unit_price
-    
-    @property
-    def pending_qty(self):
-        """待收货数量"""
-        return self.quantity - self.received_qty
+
+
+# 收货汇总：SQL 侧标量子查询聚合，未加载 items 时不再逐单懒加载明细。
+# 默认延迟加载，列表类查询用 db.undefer(PurchaseOrder.items_received_amount) 等随主查询取回。
+def _items_aggregate(expr):
+    return db.column_property(
+        db.select(db.func.coalesce(db.func.sum(expr), 0))
+        .where(PurchaseOrderItem.order_id == PurchaseOrder.id)
+        .correlate_except(PurchaseOrderItem)
+        .scalar_subquery(),
+        deferred=True
+    )
+
+
+PurchaseOrder.items_received_amount = _items_aggregate(PurchaseOrderItem.received_qty * PurchaseOrderItem.unit_price)
+PurchaseOrder.items_total_qty = _items_aggregate(PurchaseOrderItem.quantity)
+PurchaseOrder.items_received_qty = _items_aggregate(PurchaseOrderItem.received_qty)
 
 
 class PurchasePriceHistory(BaseModel):
     """采购价格历史"""
     __tablename__ = 'purchase_price_history'
+    __table_args__ = (
+        # 取某供应商某商品的最近采购价：一次索引定位
+        db.Index('ix_purchase_price_history_product_id_supplier_id_effective_date',
+                 'product_id', 'supplier_id', 'effective_date'),
+    )
     
     product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id'))
     supplier_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id'))
     
-    price = db.Column(db.Float)
+    price = db.Column(Money)
     effective_date = db.Column(db.Date, default=datetime.utcnow)
     
     product = db.relationship('Product')
@@ -103,22 +152,67 @@ class SupplierPerformance(BaseModel):
     total_orders = db.Column(db.Integer, default=0)
     on_time_orders = db.Column(db.Integer, default=0)  # 准时交货订单数
     quality_pass_orders = db.Column(db.Integer, default=0)  # 质量合格订单数
-    total_amount = db.Column(db.Float, default=0.0)  # 累计采购金额
+    total_amount = db.Column(Money, default=0.0)  # 累计采购金额
     
     last_order_date = db.Column(db.DateTime)
     
     supplier = db.relationship('Partner')
     
-    @property
+    @hybrid_property
     def on_time_rate(self):
         """准时交货率"""
         if self.total_orders == 0:
             return 100.0
         return round(self.on_time_orders / self.total_orders * 100, 1)
     
-    @property
+    @on_time_rate.expression
+    def on_time_rate(cls):
+        return db.case(
+            (cls.total_orders == 0, 100.0),
+            else_=db.func.round(cls.on_time_orders * 100.0 / cls.total_orders, 1)
+        )
+    
+    @hybrid_property
     def quality_rate(self):
         """质量合格率"""
         if self.total_orders == 0:
             return 100.0
         return round(self.quality_pass_orders / self.total_orders * 100, 1)
+    
+    @quality_rate.expression
+    def quality_rate(cls):
+        return db.case(
+            (cls.total_orders == 0, 100.0),
+            else_=db.func.round(cls.quality_pass_orders * 100.0 / cls.total_orders, 1)
+        )
+    
+    @classmethod
+    def record_order(cls, supplier_id, amount, on_time=True, quality_pass=True):
+        """
+        累加一张完成的采购单：单条 INSERT ... ON CONFLICT (supplier_id) DO UPDATE，
+        计数在 SQL 侧原子累加，并发收货不会重复建档或丢失更新
+        """
+        now = datetime.utcnow()
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(cls).values(
+            supplier_id=supplier_id,
+            total_orders=1,
+            on_time_orders=int(on_time),
+            quality_pass_orders=int(quality_pass),
+            total_amount=amount,
+            last_order_date=now
+        )
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['supplier_id'],
+            set_={
+                'total_orders': db.func.coalesce(cls.total_orders, 0) + excluded.total_orders,
+                'on_time_orders': db.func.coalesce(cls.on_time_orders, 0) + excluded.on_time_orders,
+                'quality_pass_orders': db.func.coalesce(cls.quality_pass_orders, 0) + excluded.quality_pass_orders,
+                'total_amount': db.func.coalesce(cls.total_amount, 0) + excluded.total_amount,
+                'last_order_date': excluded.last_order_date,
+                'updated_at': now
+            }
+        )
+        db.session.execute(stmt)
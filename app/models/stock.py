@@ -1,3 +1,5 @@
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
 from app.extensions import db
 from .base import BaseModel
 
@@ -7,6 +9,9 @@ class Warehouse(BaseModel):
     name = db.Column(db.String(64))
     location = db.Column(db.String(128))
     capacity = db.Column(db.Integer, default=10000) # 最大库容量
+    
+    # 只读反向集合：库存行只通过 Stock 的原子增减写入，session 不必跟踪这一侧
+    stocks = db.relationship('Stock', back_populates='warehouse', viewonly=True, lazy='raise_on_sql')
 
 class Stock(BaseModel):
     """
@@ -14,17 +19,71 @@ class Stock(BaseModel):
     记录某商品在某仓库的数量
     """
     __tablename__ = 'stock_quantities'
+    __table_args__ = (
+        # 每个 (产品, 仓库) 只有一条库存记录；同时作为定位库存的索引和 UPSERT 的冲突目标
+        db.UniqueConstraint('product_id', 'warehouse_id', name='uq_stock_quantities_product_id_warehouse_id'),
+    )
     
-    product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id'))
-    warehouse_id = db.Column(db.Integer, db.ForeignKey('stock_warehouses.id'))
+    product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id', deferrable=True, initially='IMMEDIATE'))
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('stock_warehouses.id', deferrable=True, initially='IMMEDIATE'))
     quantity = db.Column(db.Integer, default=0)
     
     # 货架位置 (WMS 高级功能)
     shelf_location = db.Column(db.String(32)) # e.g., "A-01-03"
     
     # 关系
-    product = db.relationship('Product', backref='stocks')
-    warehouse = db.relationship('Warehouse', backref='stocks')
+    product = db.relationship('Product', back_populates='stocks')
+    warehouse = db.relationship('Warehouse', back_populates='stocks')
+    
+    @classmethod
+    def _upsert(cls, product_id, warehouse_id, quantity, update_quantity):
+        """单条 INSERT ... ON CONFLICT DO UPDATE ... RETURNING quantity"""
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(cls).values(product_id=product_id, warehouse_id=warehouse_id, quantity=quantity)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['product_id', 'warehouse_id'],
+            set_={'quantity': update_quantity, 'updated_at': datetime.utcnow()}
+        ).returning(cls.quantity)
+        return db.session.execute(stmt).scalar()
+    
+    @classmethod
+    def apply_delta(cls, product_id, warehouse_id, delta):
+        """
+        原子地增减库存，返回变动后的数量。
+        扣减后会小于 0 时不做修改并返回 None（库存不足）。
+        """
+        if delta < 0:
+            return db.session.execute(
+                db.update(cls)
+                .where(cls.product_id == product_id,
+                       cls.warehouse_id == warehouse_id,
+                       cls.quantity + delta >= 0)
+                .values(quantity=cls.quantity + delta)
+                .returning(cls.quantity)
+                .execution_options(synchronize_session=False)
+            ).scalar()
+        return cls._upsert(product_id, warehouse_id, delta, cls.quantity + delta)
+    
+    @classmethod
+    def set_quantity(cls, product_id, warehouse_id, quantity):
+        """原子地把库存设为指定数量（不存在则创建）"""
+        return cls._upsert(product_id, warehouse_id, quantity, quantity)
+    
+    @classmethod
+    def set_quantities(cls, rows):
+        """
+        批量设定库存：一条多值 INSERT ... ON CONFLICT DO UPDATE，已有记录直接覆盖数量。
+        :param rows: [{'product_id': 1, 'warehouse_id': 1, 'quantity': 10}, ...]，同一 (产品, 仓库) 只能出现一次
+        """
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(cls).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['product_id', 'warehouse_id'],
+            set_={'quantity': stmt.excluded.quantity, 'updated_at': datetime.utcnow()}
+        )
+        db.session.execute(stmt)
 
 class InventoryLog(BaseModel):
     """
@@ -32,6 +91,13 @@ class InventoryLog(BaseModel):
     记录每一次库存变动的详情，用于复式记账审计
     """
     __tablename__ = 'stock_logs'
+    __table_args__ = (
+        # 商品详情页的最近流水
+        db.Index('ix_stock_logs_product_id_created_at', 'product_id', 'created_at'),
+        # 只追加写入的流水表：PostgreSQL 上用 BRIN 服务按日期区间的报表扫描，体积远小于 B-tree
+        db.Index('ix_stock_logs_created_at_brin', 'created_at',
+                 postgresql_using='brin').ddl_if(dialect='postgresql'),
+    )
     
     TYPE_IN = 'inbound'   # 入库
     TYPE_OUT = 'outbound' # 出库
@@ -41,13 +107,13 @@ class InventoryLog(BaseModel):
     transaction_code = db.Column(db.String(32), index=True) # 关联的单据号
     move_type = db.Column(db.String(20))
     
-    product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id'))
-    warehouse_id = db.Column(db.Integer, db.ForeignKey('stock_warehouses.id'))
+    product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id', deferrable=True, initially='IMMEDIATE'))
+    warehouse_id = db.Column(db.Integer, db.ForeignKey('stock_warehouses.id', deferrable=True, initially='IMMEDIATE'))
     
-    qty_change = db.Column(db.Integer) # 变动数量 (+10, -5)
-    balance_after = db.Column(db.Integer) # 变动后结余 (快照)
+    qty_change = db.Column(db.BigInteger) # 变动数量 (+10, -5)
+    balance_after = db.Column(db.BigInteger) # 变动后结余 (快照)
     
-    operator_id = db.Column(db.Integer, db.ForeignKey('auth_users.id')) # 操作人
+    operator_id = db.Column(db.Integer, db.ForeignKey('auth_users.id', deferrable=True, initially='IMMEDIATE')) # 操作人
     remark = db.Column(db.String(255))
     
     operator = db.relationship('User')
@@ -1,12 +1,19 @@
 """盘点相关模型"""
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.hybrid import hybrid_property
 from app.extensions import db
-from .base import BaseModel
+from .base import BaseModel, Money
 from datetime import datetime
 
 
 class StockTake(BaseModel):
     """盘点单"""
     __tablename__ = 'stock_takes'
+    __table_args__ = (
+        # "哪些盘点单覆盖商品 X"：product_ids.any(X) / contains([X]) 走 GIN，仅 PostgreSQL
+        db.Index('ix_stock_takes_product_ids', 'product_ids',
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     TYPE_FULL = 'full'          # 全盘
     TYPE_PARTIAL = 'partial'    # 抽盘
@@ -25,8 +32,9 @@ class StockTake(BaseModel):
     status = db.Column(db.String(20), default=STATUS_DRAFT, index=True)
     
     # 盘点范围（抽盘时使用）
-    category_ids = db.Column(db.JSON)  # 指定分类
-    product_ids = db.Column(db.JSON)   # 指定产品
+    # PostgreSQL 上为 INTEGER[]，其他数据库仍为 JSON 列表
+    category_ids = db.Column(db.JSON().with_variant(ARRAY(db.Integer), 'postgresql'))  # 指定分类
+    product_ids = db.Column(db.JSON().with_variant(ARRAY(db.Integer), 'postgresql'))   # 指定产品
     
     # 时间信息
     planned_date = db.Column(db.Date)
@@ -49,7 +57,9 @@ class StockTake(BaseModel):
     warehouse = db.relationship('Warehouse')
     creator = db.relationship('User', foreign_keys=[created_by])
     approver = db.relationship('User', foreign_keys=[approved_by])
-    items = db.relationship('StockTakeItem', backref='stock_take', cascade='all, delete-orphan')
+    # 明细集合禁止隐式懒加载，调用方需显式 selectinload(StockTake.items)
+    items = db.relationship('StockTakeItem', back_populates='stock_take', lazy='raise_on_sql',
+                            cascade='all, delete-orphan', passive_deletes=True)
     
     @property
     def progress(self):
@@ -57,28 +67,18 @@ class StockTake(BaseModel):
         if self.total_items == 0:
             return 0
         return round(self.counted_items / self.total_items * 100, 1)
-    
-    @property
-    def total_variance_qty(self):
-        """总差异数量"""
-        return sum([item.variance_qty for item in self.items])
-    
-    @property
-    def total_variance_value(self):
-        """总差异金额"""
-        return sum([item.variance_value for item in self.items])
 
 
 class StockTakeItem(BaseModel):
     """盘点明细"""
     __tablename__ = 'stock_take_items'
     
-    take_id = db.Column(db.Integer, db.ForeignKey('stock_takes.id'))
+    take_id = db.Column(db.Integer, db.ForeignKey('stock_takes.id', ondelete='CASCADE'))
     product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id'))
     
     system_qty = db.Column(db.Integer, default=0)   # 系统数量
     actual_qty = db.Column(db.Integer)              # 实盘数量（null表示未盘）
-    unit_cost = db.Column(db.Float, default=0.0)    # 单位成本
+    unit_cost = db.Column(Money, default=0.0)    # 单位成本
     
     shelf_location = db.Column(db.String(32))       # 货位
     counted_at = db.Column(db.DateTime)
@@ -86,6 +86,7 @@ class StockTakeItem(BaseModel):
     
     remark = db.Column(db.Text)
     
+    stock_take = db.relationship('StockTake', back_populates='items')
     product = db.relationship('Product')
     counter = db.relationship('User')
     
@@ -94,19 +95,23 @@ class StockTakeItem(BaseModel):
         """是否已盘点"""
         return self.actual_qty is not None
     
-    @property
+    @hybrid_property
     def variance_qty(self):
         """差异数量"""
         if self.actual_qty is None:
             return 0
         return self.actual_qty - self.system_qty
     
-    @property
+    @variance_qty.expression
+    def variance_qty(cls):
+        return db.func.coalesce(cls.actual_qty - cls.system_qty, 0)
+    
+    @hybrid_property
     def variance_value(self):
         """差异金额"""
         return self.variance_qty * self.unit_cost
     
-    @property
+    @hybrid_property
     def variance_type(self):
         """差异类型"""
         if self.variance_qty > 0:
@@ -115,6 +120,31 @@ class StockTakeItem(BaseModel):
             return 'loss'     # 盘亏
         else:
             return 'match'    # 相符
+    
+    @variance_type.expression
+    def variance_type(cls):
+        return db.case(
+            (cls.variance_qty > 0, 'surplus'),
+            (cls.variance_qty < 0, 'loss'),
+            else_='match'
+        )
+
+
+# 总差异数量 / 金额：SQL 侧标量子查询聚合（未盘明细 actual_qty 为 NULL，不计入）。
+# 默认延迟加载，需要时用 db.undefer(StockTake.total_variance_qty) 随主查询取回。
+def _variance_aggregate(expr):
+    return db.column_property(
+        db.select(db.func.coalesce(db.func.sum(expr), 0))
+        .where(StockTakeItem.take_id == StockTake.id)
+        .correlate_except(StockTakeItem)
+        .scalar_subquery(),
+        deferred=True
+    )
+
+
+_variance_qty = StockTakeItem.actual_qty - StockTakeItem.system_qty
+StockTake.total_variance_qty = _variance_aggregate(_variance_qty)
+StockTake.total_variance_value = _variance_aggregate(_variance_qty * StockTakeItem.unit_cost)
 
 
 class StockTakeHistory(BaseModel):
@@ -32,11 +32,15 @@ class AiChatSession(BaseModel):
     title = db.Column(db.String(128), default='新对话')
     last_message_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_archived = db.Column(db.Boolean, default=False)
+    # 消息数 / token 总量冗余计数，由 AiChatMessage 的插入/删除事件维护，序列化和统计时无需扫描消息表
+    message_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    total_tokens = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # 关系
-    user = db.relationship('User', backref=db.backref('ai_sessions', lazy='dynamic'))
-    messages = db.relationship('AiChatMessage', backref='session', lazy='dynamic', 
-                               order_by='AiChatMessage.created_at', cascade='all, delete-orphan')
+    user = db.relationship('User', back_populates='ai_sessions')
+    messages = db.relationship('AiChatMessage', back_populates='session', lazy='select', 
+                               order_by='AiChatMessage.created_at', cascade='all, delete-orphan',
+                               passive_deletes=True)
     
     def to_dict(self):
         return {
@@ -44,7 +48,8 @@ class AiChatSession(BaseModel):
             'title': self.title,
             'lastMessageAt': self.last_message_at.isoformat() if self.last_message_at else None,
             'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'messageCount': self.messages.count()
+            'messageCount': self.message_count or 0,
+            'totalTokens': self.total_tokens or 0
         }
 
 
@@ -52,11 +57,13 @@ class AiChatMessage(BaseModel):
     """AI 对话消息"""
     __tablename__ = 'sys_ai_messages'
     
-    session_id = db.Column(db.Integer, db.ForeignKey('sys_ai_sessions.id'), nullable=False, index=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('sys_ai_sessions.id', ondelete='CASCADE'), nullable=False, index=True)
     role = db.Column(db.String(16), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
     tokens = db.Column(db.Integer, default=0)
     
+    session = db.relationship('AiChatSession', back_populates='messages')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -64,4 +71,24 @@ class AiChatMessage(BaseModel):
             'content': self.content,
             'tokens': self.tokens,
             'createdAt': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+
+def _adjust_session_counters(connection, message, sign):
+    sessions = AiChatSession.__table__
+    connection.execute(
+        db.update(sessions)
+        .where(sessions.c.id == message.session_id)
+        .values(message_count=sessions.c.message_count + sign,
+                total_tokens=sessions.c.total_tokens + sign * (message.tokens or 0))
+    )
+
+
+@db.event.listens_for(AiChatMessage, 'after_insert')
+def _increment_session_counters(mapper, connection, target):
+    _adjust_session_counters(connection, target, 1)
+
+
+@db.event.listens_for(AiChatMessage, 'after_delete')
+def _decrement_session_counters(mapper, connection, target):
+    _adjust_session_counters(connection, target, -1)
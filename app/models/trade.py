@@ -1,9 +1,13 @@
 from app.extensions import db
-from .base import BaseModel
+from .base import BaseModel, Money
 
 class Order(BaseModel):
     """销售订单头"""
     __tablename__ = 'trade_orders'
+    __table_args__ = (
+        # 按状态筛选并按时间排序（看板、报表）
+        db.Index('ix_trade_orders_status_created_at', 'status', 'created_at'),
+    )
     
     STATUS_PENDING = 'pending'
     STATUS_PAID = 'paid'
@@ -12,26 +16,26 @@ class Order(BaseModel):
     STATUS_CANCEL = 'cancelled'
     
     order_no = db.Column(db.String(32), unique=True, index=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id'))
-    seller_id = db.Column(db.Integer, db.ForeignKey('auth_users.id')) # 销售员
+    customer_id = db.Column(db.Integer, db.ForeignKey('biz_partners.id', deferrable=True, initially='IMMEDIATE'))
+    seller_id = db.Column(db.Integer, db.ForeignKey('auth_users.id', deferrable=True, initially='IMMEDIATE')) # 销售员
     
-    total_amount = db.Column(db.Float, default=0.0)
-    status = db.Column(db.String(20), default=STATUS_PENDING, index=True)
+    total_amount = db.Column(Money, default=0.0)
+    status = db.Column(db.String(20), default=STATUS_PENDING)
     
     # 关系
     customer = db.relationship('Partner', foreign_keys=[customer_id])
     seller = db.relationship('User', foreign_keys=[seller_id])
-    items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan')
+    items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan', passive_deletes=True)
 
 class OrderItem(BaseModel):
     """订单明细行"""
     __tablename__ = 'trade_order_items'
     
-    order_id = db.Column(db.Integer, db.ForeignKey('trade_orders.id'))
-    product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id'))
+    order_id = db.Column(db.Integer, db.ForeignKey('trade_orders.id', ondelete='CASCADE', deferrable=True, initially='IMMEDIATE'))
+    product_id = db.Column(db.Integer, db.ForeignKey('biz_products.id', deferrable=True, initially='IMMEDIATE'))
     
     quantity = db.Column(db.Integer, default=1)
-    price_snapshot = db.Column(db.Float) # 下单时的单价快照
+    price_snapshot = db.Column(Money) # 下单时的单价快照
     
     product = db.relationship('Product')
     
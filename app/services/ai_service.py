@@ -3,11 +3,17 @@ DeepSeek AI 助手服务
 提供智能对话、数据分析、代码生成等功能
 使用 httpx 直接调用 API，无需 OpenAI SDK
 """
+import os
 import re
+import atexit
+import hashlib
+import functools
 from flask import current_app
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Tuple, Iterator
 import json
 import httpx
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 
 try:
@@ -16,9 +22,141 @@ try:
 except ImportError:
     HAS_TIKTOKEN = False
 
-from app.extensions import db
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2 (pip install httpx[http2])
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+from app.extensions import db, cache
 from app.models.auth import User
 
+# 系统提示词：模块级常量，保证每次请求的前缀逐字节一致，以命中 DeepSeek 服务端的前缀 KV 缓存
+# （缓存命中的输入 token 按约 1/10 计费）。不要在其中拼入时间戳、用户名等可变内容。
+SYSTEM_PROMPT = """你是 NEXUS PRIME 企业管理系统的智能助手。
+你的职责是帮助用户：
+1. 解答系统使用问题
+2. 分析业务数据并提供洞察
+3. 生成报表和可视化建议
+4. 优化库存和销售策略
+5. 提供 Python/Flask 代码帮助
+
+请用专业、友好的语气回答，必要时使用 Markdown 格式。"""
+INVENTORY_ANALYST_PROMPT = "你是一位专业的供应链管理顾问。"
+REPORT_ANALYST_PROMPT = "你是一位资深的商业数据分析师。"
+
+# 对话日志在后台线程写库，不占用响应路径上的一次数据库往返
+_LOG_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ai-log')
+
+# 分析类回答缓存时长：底层数据未变时直接复用上次的 AI 回答
+AI_RESPONSE_CACHE_TIMEOUT = 3600
+
+# count_tokens 的字符分类正则，模块加载时编译一次。
+# 三个分组字符集互不相交，一次 finditer 扫描即可按命中的分组 (lastindex) 分别计数：
+# 1=中文字符, 2=英文单词, 3=标点符号
+_CLASSIFY_RE = re.compile(r'([\u4e00-\u9fff])|([a-zA-Z]+)|([^\w\s])')
+
+# 低于该长度的纯 ASCII 文本在 auto 模式下直接估算（method 记为 'estimate-fast'）
+_FAST_PATH_MAX_CHARS = 64
+
+
+def _dumps(obj) -> str:
+    """提示词中的数据块序列化：有 orjson 时用它（输出与 json.dumps(indent=2, ensure_ascii=False) 一致）"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_tokenizer(name: str = 'cl100k_base'):
+    """
+    进程级缓存的 tiktoken 编码器，无论创建多少个 AIService 实例只加载一次。
+    加载失败返回 None 并同样缓存，避免每次计数都重试 get_encoding。
+    """
+    if not HAS_TIKTOKEN:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def _count_tokens_impl(text: str, method: str) -> Tuple[int, int, str]:
+    """计数核心（纯函数）：返回 (tokens, words, 实际使用的方法)"""
+    # 计算单词数：英文按空格分，中文按字计算
+    counts = [0, 0, 0, 0]
+    for m in _CLASSIFY_RE.finditer(text):
+        counts[m.lastindex] += 1
+    _, chinese_chars, english_words, punctuations = counts
+    words = chinese_chars + english_words
+    
+    tokens = 0
+    used_method = 'estimate'
+    
+    # 短 ASCII 文本（聊天里最常见的短句）估算已足够准确，auto 模式下不再调用编码器
+    if method == 'auto' and len(text) < _FAST_PATH_MAX_CHARS and text.isascii():
+        tokens = max(int(english_words * 0.75 + punctuations * 0.5), 1)
+        return tokens, words, 'estimate-fast'
+    
+    if method in ('tiktoken', 'auto'):
+        tokenizer = _load_tokenizer()
+        if tokenizer:
+            try:
+                tokens = len(tokenizer.encode(text))
+                used_method = 'tiktoken'
+            except Exception:
+                pass
+    
+    if used_method == 'estimate' or method == 'estimate':
+        # 估算方法：中文约 1.5 token/字，英文约 0.75 token/词
+        tokens = int(chinese_chars * 1.5 + english_words * 0.75 + punctuations * 0.5)
+        tokens = max(tokens, 1)
+        used_method = 'estimate'
+    
+    return tokens, words, used_method
+
+
+@dataclass
+class ConversationState:
+    """
+    发送给模型的对话历史：消息只在尾部追加，从不改写中间内容。
+    超出 token 预算时按固定步长（预算的一半）整条丢弃头部消息，截断点只在累计 token
+    跨过步长边界时才前移，相邻多轮请求因此共享同一段前缀，可持续命中服务端前缀缓存。
+    """
+    messages: List[Dict] = field(default_factory=list)
+    tokens: List[int] = field(default_factory=list)
+
+    def append(self, message: Dict, tokens: int) -> None:
+        self.messages.append(message)
+        self.tokens.append(tokens)
+
+    def window(self, budget: int) -> List[Dict]:
+        """返回不超过 budget 的历史窗口（从头部整条丢弃）"""
+        total = sum(self.tokens)
+        if total <= budget:
+            return list(self.messages)
+        step = max(budget // 2, 1)
+        # 需丢弃的 token 数向上取整到步长的整数倍，保证截断点成段前移而不是逐轮滑动
+        drop = -(-(total - budget) // step) * step
+        dropped = 0
+        for start, tokens in enumerate(self.tokens):
+            if dropped >= drop:
+                return self.messages[start:]
+            dropped += tokens
+        return []
+
+
+# 对话中重复出现的内容（系统提示词、反复引用的消息）直接命中缓存；
+# 编码器进程级唯一，结果与请求无关。超长文本不进缓存，避免大段文本常驻内存
+_TOKEN_CACHE_MAX_TEXT = 8192
+_count_tokens_cached = functools.lru_cache(maxsize=4096)(_count_tokens_impl)
+
 
 class AIService:
     """DeepSeek AI 服务封装 - 使用 httpx 直接调用 API"""
@@ -30,22 +168,18 @@ class AIService:
     }
     
     def __init__(self):
-        self._http_clients = {}  # 缓存 httpx 客户端
-        self._tokenizer = None   # 缓存 tokenizer
+        self._http_clients = {}  # 缓存 httpx 客户端，键为 (base_url, api_key)
         self.model = "deepseek-chat"
         self.timeout = 60.0
-    
-    def _get_tokenizer(self):
-        """获取或创建 tokenizer（使用 cl100k_base，与 DeepSeek 兼容）"""
-        if not HAS_TIKTOKEN:
-            return None
-        if self._tokenizer is None:
-            try:
-                self._tokenizer = tiktoken.get_encoding("cl100k_base")
-            except Exception:
-                # 如果无法加载，返回 None，后续使用估算方法
-                return None
-        return self._tokenizer
+        # 对话请求体中固定不变的部分，每次请求浅拷贝后只填入 messages
+        self._request_skeleton = {
+            "model": self.model,
+            "temperature": 0.7,
+            "max_tokens": 2000,
+            "stream": True,
+            # 最后一个数据块附带整次请求的 token 用量
+            "stream_options": {"include_usage": True}
+        }
     
     def count_tokens(self, text: str, method: str = 'auto') -> Dict:
         """
@@ -77,28 +211,8 @@ class AIService:
             }
         
         characters = len(text)
-        # 计算单词数：英文按空格分，中文按字计算
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_words = len(re.findall(r'[a-zA-Z]+', text))
-        words = chinese_chars + english_words
-        
-        tokens = 0
-        used_method = 'estimate'
-        
-        if method in ('tiktoken', 'auto'):
-            tokenizer = self._get_tokenizer()
-            if tokenizer:
-                try:
-                    tokens = len(tokenizer.encode(text))
-                    used_method = 'tiktoken'
-                except Exception:
-                    pass
-        
-        if used_method == 'estimate' or method == 'estimate':
-            # 估算方法：中文约 1.5 token/字，英文约 0.75 token/词
-            tokens = int(chinese_chars * 1.5 + english_words * 0.75 + len(re.findall(r'[^\w\s]', text)) * 0.5)
-            tokens = max(tokens, 1)
-            used_method = 'estimate'
+        counter = _count_tokens_cached if characters <= _TOKEN_CACHE_MAX_TEXT else _count_tokens_impl
+        tokens, words, used_method = counter(text, method)
         
         # 计算费用估算
         pricing = self.PRICING.get(self.model, self.PRICING['deepseek-chat'])
@@ -136,19 +250,30 @@ class AIService:
         output_tokens = 0
         breakdown = []
         
-        for msg in messages:
-            content = msg.get('content', '')
+        # 有 tokenizer 时整段对话一次批量编码（tiktoken 在多线程中并行），否则逐条估算
+        contents = [msg.get('content', '') or '' for msg in messages]
+        lengths = None
+        tokenizer = _load_tokenizer()
+        if tokenizer and contents:
+            try:
+                batches = tokenizer.encode_ordinary_batch(contents, num_threads=os.cpu_count() or 1)
+                lengths = [len(ids) for ids in batches]
+            except Exception:
+                lengths = None
+        if lengths is None:
+            lengths = [self.count_tokens(content)['tokens'] for content in contents]
+        
+        for msg, content, tokens in zip(messages, contents, lengths):
             role = msg.get('role', 'user')
-            result = self.count_tokens(content)
             
             if role in ('user', 'system'):
-                input_tokens += result['tokens']
+                input_tokens += tokens
             else:
-                output_tokens += result['tokens']
+                output_tokens += tokens
             
             breakdown.append({
                 'role': role,
-                'tokens': result['tokens'],
+                'tokens': tokens,
                 'preview': content[:50] + '...' if len(content) > 50 else content
             })
         
@@ -177,11 +302,41 @@ class AIService:
         
         return key, endpoint
     
-    def _get_http_client(self) -> httpx.Client:
-        """获取或创建 httpx 客户端"""
-        if 'default' not in self._http_clients:
-            self._http_clients['default'] = httpx.Client(timeout=self.timeout)
-        return self._http_clients['default']
+    @staticmethod
+    def _api_url(base_url: str) -> str:
+        """规范化 API 地址，确保以 /v1 结尾"""
+        api_url = base_url.rstrip('/')
+        if not api_url.endswith('/v1'):
+            api_url += '/v1'
+        return api_url
+    
+    def _get_http_client(self, base_url: str, api_key: str) -> httpx.Client:
+        """
+        按 (API 地址, API Key) 获取或创建长连接客户端。
+        连接池保持 keep-alive，后续请求复用已建立的 TCP/TLS 连接；安装了 h2 时启用 HTTP/2 多路复用。
+        Authorization 作为客户端默认头只格式化一次，HTTP/2 下经 HPACK 索引后每次请求仅占几个字节。
+        以原始 base_url 为键查找，规范化后的 api_url 只在创建连接池时计算一次并绑定在客户端上。
+        """
+        client = self._http_clients.get((base_url, api_key))
+        if client is None:
+            api_url = self._api_url(base_url)
+            # 写法不同但规范化后相同的地址（末尾斜杠、是否带 /v1）共用同一个连接池
+            client = self._http_clients.get((api_url, api_key))
+        if client is None:
+            client = httpx.Client(
+                base_url=api_url,
+                http2=HAS_HTTP2,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60),
+                timeout=self.timeout,
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+            self._http_clients[(api_url, api_key)] = client
+            atexit.register(client.close)
+        self._http_clients[(base_url, api_key)] = client
+        return client
     
     def is_configured(self, user: Optional[User] = None) -> bool:
         """检查 AI 服务是否已正确配置"""
@@ -210,7 +365,7 @@ class AIService:
         system_prompt: Optional[str] = None
     ) -> Dict:
         """
-        发送消息到 DeepSeek AI（使用 httpx 直接调用）
+        发送消息到 DeepSeek AI（阻塞式，内部消费 chat_stream 并拼接完整回复）
         
         Args:
             message: 用户消息
@@ -221,6 +376,51 @@ class AIService:
         Returns:
             {"success": bool, "content": str, "usage": dict, "error": str}
         """
+        for event in self.chat_stream(message, user=user, context=context, system_prompt=system_prompt):
+            if event['type'] == 'done':
+                return {
+                    "success": True,
+                    "content": event['content'],
+                    "usage": event['usage'],
+                    "error": None
+                }
+            if event['type'] == 'error':
+                return {
+                    "success": False,
+                    "content": "",
+                    "usage": {},
+                    "error": event['error']
+                }
+        return {
+            "success": False,
+            "content": "",
+            "usage": {},
+            "error": "AI 服务未返回结果"
+        }
+    
+    def _build_conversation(self, context: List[Dict]) -> ConversationState:
+        """由历史消息构建对话状态（逐条计数走 count_tokens 的进程级缓存）"""
+        state = ConversationState()
+        for msg in context:
+            state.append(msg, self.count_tokens(msg.get('content', ''))['tokens'])
+        return state
+    
+    def chat_stream(
+        self, 
+        message: str, 
+        user: Optional[User] = None,
+        context: Optional[List[Dict]] = None,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        流式对话：以 SSE 方式请求 DeepSeek，边接收边产出增量内容，首字延迟不再等待整段生成，
+        内存占用也不随回复长度增长。
+        
+        Yields:
+            {"type": "delta", "content": str}                          # 增量文本
+            {"type": "done", "content": str, "usage": dict}            # 结束：完整回复与 token 用量
+            {"type": "error", "error": str}                            # 出错（之后不再产出）
+        """
         try:
             # 获取用户凭证
             user_api_key, user_base = self._resolve_user_credentials(user)
@@ -243,118 +443,90 @@ class AIService:
                                 f" 我已对问题进行简单分析：\n\n{message[:100]}\n\n"
                                 "提示：如需更智能的回复，请在 系统设置 -> AI 设置 中配置 DeepSeek API Key。"
                             )
-
-                        return {
-                            "success": True,
-                            "content": content,
-                            "usage": {},
-                            "error": None
-                        }
                     except Exception as e:
-                        return {
-                            "success": False,
-                            "content": "",
-                            "usage": {},
-                            "error": f"本地回退失败: {str(e)}"
-                        }
+                        yield {"type": "error", "error": f"本地回退失败: {str(e)}"}
+                        return
+                    
+                    yield {"type": "delta", "content": content}
+                    yield {"type": "done", "content": content, "usage": {}}
+                    return
 
-                return {
-                    "success": False,
-                    "content": "",
-                    "usage": {},
+                yield {
+                    "type": "error",
                     "error": "AI 服务未配置。请在用户设置中配置您的 DeepSeek API Key，或联系管理员配置系统级 API Key。"
                 }
+                return
             
-            # 构建消息列表
-            messages = []
+            # 构建消息列表：固定顺序 [系统提示, 较早的上下文, 本次消息]，
+            # 越稳定的内容越靠前，相邻两轮请求共享尽可能长的可缓存前缀
+            messages = [{"role": "system", "content": system_prompt or SYSTEM_PROMPT}]
             
-            # 添加系统提示
-            if not system_prompt:
-                system_prompt = """你是 NEXUS PRIME 企业管理系统的智能助手。
-你的职责是帮助用户：
-1. 解答系统使用问题
-2. 分析业务数据并提供洞察
-3. 生成报表和可视化建议
-4. 优化库存和销售策略
-5. 提供 Python/Flask 代码帮助
-
-请用专业、友好的语气回答，必要时使用 Markdown 格式。"""
-            
-            messages.append({"role": "system", "content": system_prompt})
-            
-            # 添加历史上下文（最多保留最近 10 条）
+            # 添加历史上下文：按 token 预算整条丢弃头部，不再每轮滑动截取最近 10 条
             if context:
-                messages.extend(context[-10:])
+                messages.extend(self._build_conversation(context).window(
+                    current_app.config.get('AI_CONTEXT_TOKEN_BUDGET', 6000)
+                ))
             
             # 添加当前消息
             messages.append({"role": "user", "content": message})
             
-            # 使用 httpx 直接调用 DeepSeek API
-            client = self._get_http_client()
-            
-            # 确保 base_url 以 /v1 结尾
-            api_url = base_url.rstrip('/')
-            if not api_url.endswith('/v1'):
-                api_url += '/v1'
-            
-            response = client.post(
-                f"{api_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 2000,
-                    "stream": False
-                }
-            )
+            # 使用 httpx 直接调用 DeepSeek API（客户端已绑定 base_url 与 Authorization）
+            client = self._get_http_client(base_url, api_key)
+            payload = self._request_skeleton.copy()
+            payload["messages"] = messages
             
-            # 检查响应状态
-            if response.status_code != 200:
-                error_detail = response.text
-                try:
-                    error_json = response.json()
-                    error_detail = error_json.get('error', {}).get('message', error_detail)
-                except:
-                    pass
-                raise Exception(f"API 返回错误 ({response.status_code}): {error_detail}")
+            parts = []
+            usage = {}
+            with client.stream("POST", "/chat/completions", json=payload) as response:
+                # 检查响应状态
+                if response.status_code != 200:
+                    response.read()
+                    error_detail = response.text
+                    try:
+                        error_json = response.json()
+                        error_detail = error_json.get('error', {}).get('message', error_detail)
+                    except:
+                        pass
+                    raise Exception(f"API 返回错误 ({response.status_code}): {error_detail}")
+                
+                # 解析 SSE：每行 "data: {...}"，以 "data: [DONE]" 结束
+                for line in response.iter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get('usage'):
+                        usage = chunk['usage']
+                    for choice in chunk.get('choices') or []:
+                        delta = (choice.get('delta') or {}).get('content')
+                        if delta:
+                            parts.append(delta)
+                            yield {"type": "delta", "content": delta}
             
-            # 解析响应
-            result = response.json()
-            assistant_message = result['choices'][0]['message']['content']
-            usage = result.get('usage', {})
+            assistant_message = ''.join(parts)
             
-            # 记录到数据库（如果配置了 AiChatLog 模型）
-            self._save_chat_log(getattr(user, 'id', None), message, assistant_message, usage)
+            # 记录到数据库（如果配置了 AiChatLog 模型），交给后台线程，不阻塞回复
+            _LOG_POOL.submit(
+                self._save_chat_log, current_app._get_current_object(),
+                getattr(user, 'id', None), message, assistant_message, usage
+            )
             
-            return {
-                "success": True,
+            yield {
+                "type": "done",
                 "content": assistant_message,
                 "usage": {
                     "prompt_tokens": usage.get('prompt_tokens', 0),
                     "completion_tokens": usage.get('completion_tokens', 0),
                     "total_tokens": usage.get('total_tokens', 0)
-                },
-                "error": None
+                }
             }
             
         except httpx.TimeoutException:
-            return {
-                "success": False,
-                "content": "",
-                "usage": {},
-                "error": "AI 服务响应超时，请稍后重试。"
-            }
+            yield {"type": "error", "error": "AI 服务响应超时，请稍后重试。"}
         except httpx.ConnectError:
-            return {
-                "success": False,
-                "content": "",
-                "usage": {},
-                "error": "无法连接到 AI 服务，请检查网络连接。"
-            }
+            yield {"type": "error", "error": "无法连接到 AI 服务，请检查网络连接。"}
         except Exception as e:
             error_msg = str(e)
             current_app.logger.error(f"DeepSeek API Error: {error_msg}")
@@ -369,33 +541,54 @@ class AIService:
             else:
                 friendly_error = f"AI 服务暂时不可用: {error_msg}"
             
-            return {
-                "success": False,
-                "content": "",
-                "usage": {},
-                "error": friendly_error
-            }
+            yield {"type": "error", "error": friendly_error}
     
-    def _save_chat_log(self, user_id: Optional[int], user_msg: str, ai_msg: str, usage: dict):
-        """保存对话记录到数据库"""
-        try:
-            # 尝试导入 AiChatLog 模型（如果存在）
-            from app.models.sys import AiChatLog
-            
-            log = AiChatLog(
-                user_id=user_id,
-                prompt=user_msg,
-                response=ai_msg,
-                model_version=self.model
-            )
-            db.session.add(log)
-            db.session.commit()
-        except ImportError:
-            # AiChatLog 模型不存在，跳过保存
-            pass
-        except Exception as e:
-            current_app.logger.warning(f"Failed to save chat log: {str(e)}")
-            db.session.rollback()
+    def _cached_chat(self, prompt: str, system_prompt: str, user: Optional[User] = None) -> Dict:
+        """
+        带响应缓存的 chat：以 (模型, 系统提示, 提示词) 的 sha256 为键，提示词中已包含全部数据，
+        数据快照不变即命中缓存，省去整次 API 往返。
+        使用个人 API Key / 地址的用户不读写缓存，避免不同账户间共享结果；本地回退的回答也不缓存。
+        """
+        user_key, user_base = self._resolve_user_credentials(user)
+        key = None
+        if not (user_key or user_base):
+            digest = hashlib.sha256(
+                '\x00'.join((self.model, system_prompt, prompt)).encode('utf-8')
+            ).hexdigest()
+            key = f'ai:response:{digest}'
+            content = cache.get(key)
+            if content is not None:
+                return {"success": True, "content": content, "usage": {}, "error": None}
+        
+        result = self.chat(prompt, system_prompt=system_prompt, user=user)
+        if key and result['success'] and result['usage']:
+            cache.set(key, result['content'], timeout=AI_RESPONSE_CACHE_TIMEOUT)
+        return result
+    
+    def _save_chat_log(self, app, user_id: Optional[int], user_msg: str, ai_msg: str, usage: dict):
+        """
+        保存对话记录到数据库（在 _LOG_POOL 后台线程中执行）。
+        工作线程没有请求上下文，推入独立的应用上下文，使用与请求无关的 db.session。
+        """
+        with app.app_context():
+            try:
+                # 尝试导入 AiChatLog 模型（如果存在）
+                from app.models.sys import AiChatLog
+                
+                log = AiChatLog(
+                    user_id=user_id,
+                    prompt=user_msg,
+                    response=ai_msg,
+                    model_version=self.model
+                )
+                db.session.add(log)
+                db.session.commit()
+            except ImportError:
+                # AiChatLog 模型不存在，跳过保存
+                pass
+            except Exception as e:
+                app.logger.warning(f"Failed to save chat log: {str(e)}")
+                db.session.rollback()
     
     def analyze_inventory(self, limit: int = 10, user: Optional[User] = None) -> str:
         """分析库存数据并生成建议"""
@@ -404,28 +597,43 @@ class AIService:
             from app.models.biz import Product
             from app.models.stock import Stock
             
-            qty_expr = func.coalesce(func.sum(Stock.quantity), 0)
-            stock_query = (
-                db.session.query(
-                    Product,
-                    qty_expr.label('qty')
+            # 只取需要的列，按产品聚合一次（CTE），低库存 / 高库存两个 Top-N 用 UNION ALL 一次取回
+            totals = (
+                db.select(
+                    Product.sku,
+                    Product.name,
+                    Product.price,
+                    func.coalesce(func.sum(Stock.quantity), 0).label('qty')
                 )
                 .outerjoin(Stock, Stock.product_id == Product.id)
                 .group_by(Product.id)
+                .cte('stock_totals')
             )
             
-            low_stock = stock_query.order_by(qty_expr.asc()).limit(limit).all()
-            high_stock = stock_query.order_by(qty_expr.desc()).limit(limit).all()
+            def top_n(side, order):
+                return db.select(
+                    db.select(db.literal(side).label('side'), totals)
+                    .order_by(order)
+                    .limit(limit)
+                    .subquery()
+                )
+            
+            rows = db.session.execute(
+                db.union_all(top_n('low', totals.c.qty.asc()), top_n('high', totals.c.qty.desc()))
+            ).all()
+            # UNION ALL 不保证各段顺序，按库存量重新排序
+            low_stock = sorted((r for r in rows if r.side == 'low'), key=lambda r: r.qty)
+            high_stock = sorted((r for r in rows if r.side == 'high'), key=lambda r: r.qty, reverse=True)
             
             def serialize(items):
                 return [
                     {
-                        "sku": product.sku,
-                        "name": product.name,
-                        "quantity": int(qty),
-                        "price": float(product.price) if product.price else 0
+                        "sku": row.sku,
+                        "name": row.name,
+                        "quantity": int(row.qty),
+                        "price": float(row.price) if row.price else 0
                     }
-                    for product, qty in items
+                    for row in items
                 ]
             
             analysis = {
@@ -435,22 +643,20 @@ class AIService:
                 "high_stock_items": serialize(high_stock)
             }
             
-            # 让 AI 生成分析报告
-            prompt = f"""请分析以下库存数据并提供优化建议：
+            # 让 AI 生成分析报告（固定的要求放在前面，可变的数据放在最后，保持可缓存前缀最长）
+            prompt = f"""请分析以下库存数据并提供优化建议，包括：
+1. 风险评估
+2. 补货建议
+3. 促销建议
+4. 库存优化策略
 
 低库存产品（{analysis['low_stock_count']} 个）：
-{json.dumps(analysis['low_stock_items'], ensure_ascii=False, indent=2)}
+{_dumps(analysis['low_stock_items'])}
 
 高库存产品（{analysis['high_stock_count']} 个）：
-{json.dumps(analysis['high_stock_items'], ensure_ascii=False, indent=2)}
-
-请提供：
-1. 风险评估
-2. 补货建议
-3. 促销建议
-4. 库存优化策略"""
+{_dumps(analysis['high_stock_items'])}"""
             
-            result = self.chat(prompt, system_prompt="你是一位专业的供应链管理顾问。", user=user)
+            result = self._cached_chat(prompt, INVENTORY_ANALYST_PROMPT, user=user)
             return result.get('content', '分析失败')
             
         except Exception as e:
@@ -465,14 +671,14 @@ class AIService:
             "financial": "生成财务概览和趋势分析"
         }
         
+        # 固定的要求在前、可变的数据在后，保持可缓存前缀最长
         prompt = f"""{prompts.get(report_type, '生成数据分析报告')}
+请提供详细的分析报告，包括关键指标、趋势、异常点和优化建议。
 
 数据：
-{json.dumps(data, ensure_ascii=False, indent=2)}
-
-请提供详细的分析报告，包括关键指标、趋势、异常点和优化建议。"""
+{_dumps(data)}"""
         
-        result = self.chat(prompt, system_prompt="你是一位资深的商业数据分析师。", user=user)
+        result = self._cached_chat(prompt, REPORT_ANALYST_PROMPT, user=user)
         return result.get('content', '报告生成失败')
 
 
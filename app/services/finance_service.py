@@ -1,8 +1,11 @@
 """财务服务 - 应收账款、信用管理"""
 import uuid
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
-from app.extensions import db
+from flask import g
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db, cache, evict_memoized_after_commit
+from app.models.auth import User
 from app.models.finance import CustomerCredit, Receivable, PaymentRecord, AccountStatement
 from app.models.trade import Order
 from app.models.biz import Partner
@@ -16,16 +19,25 @@ class FinanceService:
     
     @staticmethod
     def get_or_create_credit(customer_id):
-        """获取或创建客户信用记录"""
+        """
+        获取或创建客户信用记录
+        不存在时以 INSERT ... ON CONFLICT DO NOTHING 创建，并发首次访问也只会有一条；
+        不在此提交，随调用方的事务一并提交
+        """
         credit = CustomerCredit.query.filter_by(customer_id=customer_id).first()
-        if not credit:
-            credit = CustomerCredit(
-                customer_id=customer_id,
-                credit_limit=10000.0  # 默认额度
-            )
-            db.session.add(credit)
-            db.session.commit()
-        return credit
+        if credit:
+            return credit
+        
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        credit = db.session.execute(
+            insert(CustomerCredit)
+            .values(customer_id=customer_id, credit_limit=10000.0)  # 默认额度
+            .on_conflict_do_nothing(index_elements=['customer_id'])
+            .returning(CustomerCredit)
+        ).scalar()
+        # 与并发请求撞车时对方已插入，直接读取
+        return credit or CustomerCredit.query.filter_by(customer_id=customer_id).one()
     
     @staticmethod
     def set_credit_limit(customer_id, limit, user=None):
@@ -51,11 +63,30 @@ class FinanceService:
         
         return True, "信用检查通过"
     
+    @staticmethod
+    def _adjust_used_credit(customer_id, delta):
+        """
+        在一条 UPDATE 中按库内当前值增减已用额度（不低于 0）并递增版本号，返回更新后的信用记录；
+        记录不存在时返回 None。不再先 SELECT 再写回，并发下单/收款不会丢失更新
+        """
+        used_after = CustomerCredit.used_credit + delta
+        return db.session.execute(
+            db.update(CustomerCredit)
+            .where(CustomerCredit.customer_id == customer_id)
+            .values(
+                used_credit=db.case((used_after < 0, 0), else_=used_after),
+                version=CustomerCredit.version + 1
+            )
+            .returning(CustomerCredit)
+        ).scalar()
+    
     @staticmethod
     def use_credit(customer_id, amount):
         """使用信用额度"""
-        credit = FinanceService.get_or_create_credit(customer_id)
-        credit.used_credit += amount
+        credit = FinanceService._adjust_used_credit(customer_id, amount)
+        if credit is None:
+            FinanceService.get_or_create_credit(customer_id)
+            credit = FinanceService._adjust_used_credit(customer_id, amount)
         
         # 检查是否需要预警
         if credit.is_warning:
@@ -66,8 +97,7 @@ class FinanceService:
     @staticmethod
     def release_credit(customer_id, amount):
         """释放信用额度（收款后）"""
-        credit = FinanceService.get_or_create_credit(customer_id)
-        credit.used_credit = max(0, credit.used_credit - amount)
+        FinanceService._adjust_used_credit(customer_id, -amount)
         db.session.commit()
     
     @staticmethod
@@ -94,32 +124,48 @@ class FinanceService:
     
     @staticmethod
     def send_credit_warning(credit):
-        """发送信用预警通知"""
-        from app.models.auth import User
-        
-        admins = User.query.filter_by(is_admin=True, is_deleted=False).all()
-        customer = Partner.query.get(credit.customer_id)
+        """
+        发送信用预警通知
+        管理员 ID 在同一请求内复用；客户经 credit.customer 取得，调用方批量预加载
+        (selectinload(CustomerCredit.customer)) 时不再逐条查询
+        """
+        admin_ids = _admin_ids()
+        if not admin_ids:
+            return
+        customer_name = credit.customer.name
         
-        for admin in admins:
-            notification = Notification(
-                user_id=admin.id,
-                title=f"信用预警 - {customer.name}",
-                content=f"客户 {customer.name} 信用使用率达到 {credit.usage_rate}%，已超过预警阈值 {credit.warning_threshold}%",
-                type=Notification.TYPE_WARNING,
-                category=Notification.CATEGORY_ORDER,
-                related_type='customer',
-                related_id=credit.customer_id
-            )
-            db.session.add(notification)
+        title = f"信用预警 - {customer_name}"
+        content = f"客户 {customer_name} 信用使用率达到 {credit.usage_rate}%，已超过预警阈值 {credit.warning_threshold}%"
+        # 每位管理员一条通知，一条多值 INSERT 写入
+        db.session.execute(db.insert(Notification), [{
+            'user_id': admin_id,
+            'title': title,
+            'content': content,
+            'type': Notification.TYPE_WARNING,
+            'category': Notification.CATEGORY_ORDER,
+            'related_type': 'customer',
+            'related_id': credit.customer_id
+        } for admin_id in admin_ids])
+    
+    # ============== 单号 ==============
+    
+    @staticmethod
+    def _next_codes(prefix, n=1):
+        """
+        一次生成 n 个单号 {prefix}-{日期}-{12位十六进制}。
+        只取一次 48 位随机数作为起点，批内依次递增：批量生成时不再逐个调用 uuid4，
+        同批单号互不重复，与其他批次撞号的概率也可以忽略（4 位后缀每天约 300 单即有一半概率撞号）
+        """
+        date_str = datetime.now().strftime('%Y%m%d')
+        base = uuid.uuid4().int & 0xFFFFFFFFFFFF
+        return [f"{prefix}-{date_str}-{(base + i) & 0xFFFFFFFFFFFF:012X}" for i in range(n)]
     
     # ============== 应收账款 ==============
     
     @staticmethod
     def generate_receivable_no():
         """生成应收单号"""
-        date_str = datetime.now().strftime('%Y%m%d')
-        random_str = uuid.uuid4().hex[:4].upper()
-        return f"AR-{date_str}-{random_str}"
+        return FinanceService._next_codes('AR')[0]
     
     @staticmethod
     def create_receivable(order_id, due_days=30):
@@ -153,9 +199,7 @@ class FinanceService:
     @staticmethod
     def generate_payment_no():
         """生成收款单号"""
-        date_str = datetime.now().strftime('%Y%m%d')
-        random_str = uuid.uuid4().hex[:4].upper()
-        return f"PAY-{date_str}-{random_str}"
+        return FinanceService._next_codes('PAY')[0]
     
     @staticmethod
     def record_payment(receivable_id, amount, payment_method, user, reference_no=None, remark=None):
@@ -184,16 +228,17 @@ class FinanceService:
             )
             db.session.add(payment)
             
-            receivable.paid_amount += amount
-            
-            # 更新状态
-            if receivable.unpaid_amount <= 0:
-                receivable.status = Receivable.STATUS_PAID
-            else:
-                receivable.status = Receivable.STATUS_PARTIAL
+            # 已收金额与状态在同一条 UPDATE 中按库内当前值计算，并发收款不会互相覆盖；
+            # 超额收款由 ck_finance_receivables_paid_range 约束拒绝
+            paid_after = Receivable.paid_amount + amount
+            receivable.paid_amount = paid_after
+            receivable.status = db.case(
+                (paid_after >= Receivable.total_amount, Receivable.STATUS_PAID),
+                else_=Receivable.STATUS_PARTIAL
+            )
             
-            # 释放信用额度
-            FinanceService.release_credit(receivable.customer_id, amount)
+            # 释放信用额度：与收款记录、应收更新同属一个事务，只在最后提交一次
+            FinanceService._adjust_used_credit(receivable.customer_id, -amount)
             
             db.session.commit()
             return True, payment
@@ -206,52 +251,30 @@ class FinanceService:
         """更新逾期状态"""
         today = datetime.now().date()
         
-        overdue_receivables = Receivable.query.filter(
-            Receivable.status.in_([Receivable.STATUS_PENDING, Receivable.STATUS_PARTIAL]),
-            Receivable.due_date < today
-        ).all()
-        
-        for r in overdue_receivables:
-            r.status = Receivable.STATUS_OVERDUE
+        # 单条 UPDATE 走 (status, due_date) 索引，不把逾期记录逐条加载到 Python；
+        # 状态在 pending/partial/overdue 之间切换不影响账龄汇总，无需失效缓存
+        result = db.session.execute(
+            db.update(Receivable)
+            .where(Receivable.status.in_([Receivable.STATUS_PENDING, Receivable.STATUS_PARTIAL]),
+                   Receivable.due_date < today)
+            .values(status=Receivable.STATUS_OVERDUE)
+            .execution_options(synchronize_session=False)
+        )
         
         db.session.commit()
-        return len(overdue_receivables)
+        return result.rowcount
     
     @staticmethod
     def get_aging_analysis(customer_id=None):
-        """账龄分析"""
-        query = Receivable.query.filter(
-            Receivable.status.in_([Receivable.STATUS_PENDING, Receivable.STATUS_PARTIAL, Receivable.STATUS_OVERDUE])
-        )
-        
-        if customer_id:
-            query = query.filter_by(customer_id=customer_id)
-        
-        receivables = query.all()
-        
-        aging = {
-            'current': {'count': 0, 'amount': 0},
-            '0-30': {'count': 0, 'amount': 0},
-            '31-60': {'count': 0, 'amount': 0},
-            '61-90': {'count': 0, 'amount': 0},
-            '90+': {'count': 0, 'amount': 0}
-        }
-        
-        for r in receivables:
-            bucket = r.age_bucket
-            aging[bucket]['count'] += 1
-            aging[bucket]['amount'] += r.unpaid_amount
-        
-        return aging
+        """账龄分析（按当天日期缓存，应收账款变动时失效）"""
+        return _aging_snapshot(datetime.now().date(), customer_id or None)
     
     # ============== 对账单 ==============
     
     @staticmethod
     def generate_statement_no():
         """生成对账单号"""
-        date_str = datetime.now().strftime('%Y%m%d')
-        random_str = uuid.uuid4().hex[:4].upper()
-        return f"STM-{date_str}-{random_str}"
+        return FinanceService._next_codes('STM')[0]
     
     @staticmethod
     def generate_statement(customer_id, period_start, period_end, user):
@@ -301,3 +324,134 @@ class FinanceService:
         db.session.commit()
         
         return True, statement
+    
+    @staticmethod
+    def generate_statements_bulk(period_start, period_end, user, customer_ids=None):
+        """
+        批量生成对账单（月结）：默认为全部有效客户各生成一张。
+        期初、销售、收款各一条按客户分组的聚合查询，对账单一条多值 INSERT 写入，
+        查询次数与客户数无关。
+        返回: (True, 生成数量)
+        """
+        customer_query = db.select(Partner.id).where(
+            Partner.type.in_(['customer', 'both']),
+            Partner.is_deleted == False
+        )
+        if customer_ids is not None:
+            customer_query = customer_query.where(Partner.id.in_(customer_ids))
+        customers = db.session.scalars(customer_query.order_by(Partner.id)).all()
+        if not customers:
+            return True, 0
+        
+        # 期初余额：每个客户账期在本期之前的最近一张对账单的期末余额
+        ranked = db.select(
+            AccountStatement.customer_id,
+            AccountStatement.closing_balance,
+            func.row_number().over(
+                partition_by=AccountStatement.customer_id,
+                order_by=AccountStatement.period_end.desc()
+            ).label('rn')
+        ).where(
+            AccountStatement.customer_id.in_(customers),
+            AccountStatement.period_end < period_start
+        ).subquery()
+        openings = dict(db.session.execute(
+            db.select(ranked.c.customer_id, ranked.c.closing_balance).where(ranked.c.rn == 1)
+        ).all())
+        
+        # 本期销售
+        sales = dict(db.session.execute(
+            db.select(Order.customer_id, func.sum(Order.total_amount)).where(
+                Order.customer_id.in_(customers),
+                Order.created_at >= period_start,
+                Order.created_at <= period_end,
+                Order.status.in_(['paid', 'shipped', 'done'])
+            ).group_by(Order.customer_id)
+        ).all())
+        
+        # 本期收款
+        payments = dict(db.session.execute(
+            db.select(PaymentRecord.customer_id, func.sum(PaymentRecord.amount)).where(
+                PaymentRecord.customer_id.in_(customers),
+                PaymentRecord.payment_date >= period_start,
+                PaymentRecord.payment_date <= period_end
+            ).group_by(PaymentRecord.customer_id)
+        ).all())
+        
+        rows = []
+        for customer_id, statement_no in zip(customers, FinanceService._next_codes('STM', len(customers))):
+            opening_balance = openings.get(customer_id) or 0
+            sales_amount = sales.get(customer_id) or 0
+            payment_amount = payments.get(customer_id) or 0
+            rows.append({
+                'statement_no': statement_no,
+                'customer_id': customer_id,
+                'period_start': period_start,
+                'period_end': period_end,
+                'opening_balance': opening_balance,
+                'sales_amount': sales_amount,
+                'payment_amount': payment_amount,
+                'closing_balance': opening_balance + sales_amount - payment_amount,
+                'generated_by': user.id
+            })
+        
+        db.session.execute(db.insert(AccountStatement), rows)
+        db.session.commit()
+        
+        return True, len(rows)
+
+
+def _admin_ids():
+    """有效管理员 ID 列表（信用预警通知的接收人），在当前请求/应用上下文内只查询一次"""
+    if 'credit_warning_admin_ids' not in g:
+        g.credit_warning_admin_ids = db.session.scalars(
+            db.select(User.id).filter_by(is_admin=True, is_deleted=False)
+        ).all()
+    return g.credit_warning_admin_ids
+
+
+# SimpleCache 下其他 worker 的副本收不到失效，最长滞后一个 TTL，故取 60 秒
+@cache.memoize(timeout=60)
+def _aging_snapshot(as_of, customer_id):
+    """账龄分桶汇总；as_of 参与缓存键，跨日自动换键"""
+    query = Receivable.query.filter(
+        Receivable.status.in_([Receivable.STATUS_PENDING, Receivable.STATUS_PARTIAL, Receivable.STATUS_OVERDUE])
+    )
+    
+    if customer_id:
+        query = query.filter_by(customer_id=customer_id)
+    
+    # 账龄分桶与汇总在数据库中完成，只取回每个桶一行
+    buckets = query.with_entities(
+        Receivable.age_bucket.label('bucket'),
+        Receivable.unpaid_amount.label('unpaid')
+    ).subquery()
+    rows = db.session.query(
+        buckets.c.bucket,
+        func.count(),
+        func.sum(buckets.c.unpaid)
+    ).group_by(buckets.c.bucket).all()
+    
+    aging = {
+        'current': {'count': 0, 'amount': 0},
+        '0-30': {'count': 0, 'amount': 0},
+        '31-60': {'count': 0, 'amount': 0},
+        '61-90': {'count': 0, 'amount': 0},
+        '90+': {'count': 0, 'amount': 0}
+    }
+    
+    for bucket_name, count, amount in rows:
+        aging[bucket_name]['count'] = count
+        aging[bucket_name]['amount'] = float(amount or 0)
+    
+    return aging
+
+
+def _evict_aging_cache(mapper, connection, target):
+    evict_memoized_after_commit(_aging_snapshot)
+
+
+# 应收新增、收款（更新 paid_amount）、状态变更都会改变账龄汇总，提交后失效
+db.event.listen(Receivable, 'after_insert', _evict_aging_cache)
+db.event.listen(Receivable, 'after_update', _evict_aging_cache)
+db.event.listen(Receivable, 'after_delete', _evict_aging_cache)
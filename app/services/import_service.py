@@ -2,6 +2,7 @@
 import os
 import csv
 import uuid
+from itertools import islice
 from datetime import datetime
 from io import BytesIO, StringIO
 from werkzeug.utils import secure_filename
@@ -10,6 +11,18 @@ from app.models.biz import Product, Category
 from app.models.biz import Partner
 from app.models.stock import Stock, Warehouse, InventoryLog
 
+try:
+    from python_calamine import CalamineWorkbook
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+try:
+    from charset_normalizer import from_bytes
+    HAS_CHARSET_NORMALIZER = True
+except ImportError:
+    HAS_CHARSET_NORMALIZER = False
+
 
 class ImportService:
     """数据导入服务"""
@@ -17,6 +30,9 @@ class ImportService:
     # 支持的文件类型
     ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
     
+    # 每批校验并导入的行数（每批提交一次）
+    BATCH_SIZE = 1000
+    
     # 导入模板定义
     TEMPLATES = {
         'product': {
@@ -52,49 +68,97 @@ class ImportService:
                filename.rsplit('.', 1)[1].lower() in ImportService.ALLOWED_EXTENSIONS
     
     @staticmethod
-    def parse_csv(file_content, encoding='utf-8'):
-        """解析CSV文件"""
+    def _decode_csv(file_content, encoding):
+        """
+        解码CSV内容：先按指定编码解码，失败时才做编码探测；
+        装有 charset-normalizer 时用它识别编码，否则按 GBK 处理
+        """
         try:
-            content = file_content.decode(encoding)
-            reader = csv.DictReader(StringIO(content))
-            return list(reader), list(reader.fieldnames) if reader.fieldnames else []
+            return file_content.decode(encoding)
         except UnicodeDecodeError:
-            # 尝试GBK编码
-            content = file_content.decode('gbk')
-            reader = csv.DictReader(StringIO(content))
-            return list(reader), list(reader.fieldnames) if reader.fieldnames else []
+            pass
+        
+        if HAS_CHARSET_NORMALIZER:
+            matches = from_bytes(file_content)
+            best = matches.best()
+            if best is not None:
+                # 短文本常被同时判为多种编码且同样可信，此时优先 GB18030（GBK 超集，本系统数据以中文为主）
+                best = next(
+                    (m for m in matches if m.encoding == 'gb18030' and m.chaos <= best.chaos),
+                    best
+                )
+                return str(best)
+        return file_content.decode('gbk')
     
     @staticmethod
-    def parse_excel(file_content):
-        """解析Excel文件"""
+    def parse_csv(file_content, encoding='utf-8-sig'):
+        """
+        解析CSV文件
+        返回 (逐行产出 dict 的迭代器, 表头)，与 parse_excel 一致，数据行在消费时才解析
+        utf-8-sig 同时兼容带 BOM（如本系统导出的 CSV）与不带 BOM 的 UTF-8 文件
+        """
+        content = ImportService._decode_csv(file_content, encoding)
+        reader = csv.DictReader(StringIO(content))
+        return reader, list(reader.fieldnames or [])
+    
+    @staticmethod
+    def _iter_excel_rows(file_content):
+        """
+        逐行产出第一个工作表的单元格值。
+        装有 python-calamine（Rust 实现）时优先用它解析，速度约为 openpyxl 的十倍以上，并支持 .xls；
+        否则回退到 openpyxl 只读模式。
+        """
+        if HAS_CALAMINE:
+            sheet = CalamineWorkbook.from_filelike(BytesIO(file_content)).get_sheet_by_index(0)
+            for row in sheet.iter_rows():
+                # calamine 的数字一律为 float，整数值还原为 int，与 openpyxl 的结果一致（如 SKU 123 而非 123.0）
+                yield [int(v) if isinstance(v, float) and v.is_integer() else v for v in row]
+            return
+        
         try:
             import openpyxl
-            wb = openpyxl.load_workbook(BytesIO(file_content), data_only=True)
-            ws = wb.active
-            
-            rows = list(ws.iter_rows(values_only=True))
-            if not rows:
-                return [], []
-            
-            headers = [str(h).strip() if h else '' for h in rows[0]]
-            data = []
-            
-            for row in rows[1:]:
-                row_dict = {}
-                for i, value in enumerate(row):
-                    if i < len(headers) and headers[i]:
-                        row_dict[headers[i]] = str(value).strip() if value else ''
-                if any(row_dict.values()):  # 跳过空行
-                    data.append(row_dict)
-            
-            return data, headers
         except ImportError:
             raise Exception("请安装openpyxl: pip install openpyxl")
+        
+        # 只读模式：单元格按需从压缩包中流式读出，不构建整张表的单元格对象
+        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+    
+    @staticmethod
+    def parse_excel(file_content):
+        """
+        解析Excel文件
+        返回 (逐行产出 dict 的迭代器, 表头)，数据行在消费时才读取，不整表展开成列表
+        """
+        rows = ImportService._iter_excel_rows(file_content)
+        
+        first = next(rows, None)
+        if first is None:
+            return iter(()), []
+        
+        headers = [str(h).strip() if h else '' for h in first]
+        # 有列名的 (下标, 列名) 在循环外确定一次
+        columns = [(i, header) for i, header in enumerate(headers) if header]
+        
+        def iter_rows():
+            for row in rows:
+                row_dict = {
+                    header: str(row[i]).strip() if row[i] else ''
+                    for i, header in columns if i < len(row)
+                }
+                if any(row_dict.values()):  # 跳过空行
+                    yield row_dict
+        
+        return iter_rows(), headers
     
     @staticmethod
-    def validate_data(data, template_type):
+    def validate_data(data, template_type, start=2):
         """
         验证数据
+        start: 第一条数据对应的文件行号（分批校验时传入偏移）
         返回: (valid_rows, errors)
         """
         template = ImportService.TEMPLATES.get(template_type)
@@ -105,18 +169,18 @@ class ImportService:
         valid_rows = []
         errors = []
         
-        for i, row in enumerate(data, start=2):  # Excel行号从2开始（跳过表头）
-            row_errors = []
-            
-            # 检查必填字段
-            for field in required:
-                if not row.get(field) or not str(row.get(field)).strip():
-                    row_errors.append(f'缺少必填字段: {field}')
-            
-            if row_errors:
-                errors.append({'row': i, 'error': '; '.join(row_errors), 'data': row})
-            else:
+        for i, row in enumerate(data, start=start):  # Excel行号从2开始（跳过表头）
+            # 绝大多数行必填齐全，先整体判断；不全时再逐项列出缺失字段
+            if all(str(row.get(f) or '').strip() for f in required):
                 valid_rows.append({'row': i, 'data': row})
+                continue
+            
+            row_errors = [
+                f'缺少必填字段: {field}'
+                for field in required
+                if not row.get(field) or not str(row.get(field)).strip()
+            ]
+            errors.append({'row': i, 'error': '; '.join(row_errors), 'data': row})
         
         return valid_rows, errors
     
@@ -137,55 +201,80 @@ class ImportService:
         skip_count = 0
         errors = []
         
-        # 缓存分类
-        categories = {c.name: c for c in Category.query.all()}
+        # 分类名 -> ID（只取两列）
+        categories = dict(db.session.execute(db.select(Category.name, Category.id)).all())
+        # 已存在的商品一次 IN 查询取回 SKU -> ID，不再逐行按 SKU 查询
+        skus = [item['data']['sku'] for item in data]
+        existing_products = dict(db.session.execute(
+            db.select(Product.sku, Product.id).where(Product.sku.in_(skus), Product.is_deleted == False)
+        ).all()) if skus else {}
         
+        # 先收集新分类，一条多值 INSERT 写入后取回 ID（父表先于子表）
+        new_categories = {
+            item['data'].get('category', '默认分类')
+            for item in data
+            if item['data']['sku'] not in existing_products
+        } - categories.keys()
+        if new_categories:
+            categories.update(db.session.execute(
+                db.insert(Category).returning(Category.name, Category.id),
+                [{'name': name} for name in new_categories]
+            ).all())
+        
+        product_rows = []
+        update_rows = []
+        # 同一文件内重复的 SKU 只取第一行，其余计为跳过，避免重复插入撞唯一约束或重复更新
+        queued_skus = set()
         for item in data:
             row = item['row']
             d = item['data']
             
             try:
+                if d['sku'] in queued_skus:
+                    skip_count += 1
+                    continue
+                queued_skus.add(d['sku'])
+                
                 # 检查SKU是否存在
-                existing = Product.query.filter_by(sku=d['sku'], is_deleted=False).first()
+                existing_id = existing_products.get(d['sku'])
                 
-                if existing:
+                if existing_id:
                     if update_existing:
-                        existing.name = d['name']
-                        existing.cost = float(d.get('cost', 0)) if d.get('cost') else None
-                        existing.price = float(d.get('price', 0)) if d.get('price') else None
-                        existing.min_stock = int(d.get('min_stock', 0)) if d.get('min_stock') else 0
-                        existing.max_stock = int(d.get('max_stock', 0)) if d.get('max_stock') else 1000
-                        existing.description = d.get('description', '')
+                        update_rows.append({
+                            'id': existing_id,
+                            'name': d['name'],
+                            'cost': float(d.get('cost', 0)) if d.get('cost') else None,
+                            'price': float(d.get('price', 0)) if d.get('price') else None,
+                            'min_stock': int(d.get('min_stock', 0)) if d.get('min_stock') else 0,
+                            'max_stock': int(d.get('max_stock', 0)) if d.get('max_stock') else 1000,
+                            'description': d.get('description', '')
+                        })
                         success_count += 1
                     else:
                         skip_count += 1
                     continue
                 
-                # 获取或创建分类
-                category_name = d.get('category', '默认分类')
-                category = categories.get(category_name)
-                if not category:
-                    category = Category(name=category_name)
-                    db.session.add(category)
-                    db.session.flush()
-                    categories[category_name] = category
-                
-                product = Product(
-                    name=d['name'],
-                    sku=d['sku'],
-                    category_id=category.id,
-                    cost=float(d.get('cost', 0)) if d.get('cost') else None,
-                    price=float(d.get('price', 0)) if d.get('price') else None,
-                    min_stock=int(d.get('min_stock', 0)) if d.get('min_stock') else 10,
-                    max_stock=int(d.get('max_stock', 0)) if d.get('max_stock') else 1000,
-                    description=d.get('description', '')
-                )
-                db.session.add(product)
+                product_rows.append({
+                    'name': d['name'],
+                    'sku': d['sku'],
+                    'category_id': categories[d.get('category', '默认分类')],
+                    'cost': float(d.get('cost', 0)) if d.get('cost') else None,
+                    'price': float(d.get('price', 0)) if d.get('price') else None,
+                    'min_stock': int(d.get('min_stock', 0)) if d.get('min_stock') else 10,
+                    'max_stock': int(d.get('max_stock', 0)) if d.get('max_stock') else 1000,
+                    'description': d.get('description', '')
+                })
                 success_count += 1
                 
             except Exception as e:
                 errors.append({'row': row, 'error': str(e), 'data': d})
         
+        # 已存在的按主键批量 UPDATE，新商品一条多值 INSERT 写入，不在会话中逐个构造 ORM 对象
+        if update_rows:
+            db.session.execute(db.update(Product), update_rows)
+        if product_rows:
+            db.session.execute(db.insert(Product), product_rows)
+        
         db.session.commit()
         return success_count, skip_count, errors
     
@@ -196,6 +285,16 @@ class ImportService:
         skip_count = 0
         errors = []
         
+        # 已存在的往来单位一次 IN 查询取回 名称 -> ID，不再逐行按名称查询
+        names = [item['data']['name'] for item in data]
+        existing_partners = dict(db.session.execute(
+            db.select(Partner.name, Partner.id).where(Partner.name.in_(names), Partner.is_deleted == False)
+        ).all()) if names else {}
+        
+        partner_rows = []
+        update_rows = []
+        # 同一文件内重复的名称只取第一行，其余计为跳过
+        queued_names = set()
         for item in data:
             row = item['row']
             d = item['data']
@@ -206,33 +305,46 @@ class ImportService:
                     errors.append({'row': row, 'error': f"无效的类型: {d['type']}", 'data': d})
                     continue
                 
+                if d['name'] in queued_names:
+                    skip_count += 1
+                    continue
+                queued_names.add(d['name'])
+                
                 # 检查是否存在（按名称）
-                existing = Partner.query.filter_by(name=d['name'], is_deleted=False).first()
+                existing_id = existing_partners.get(d['name'])
                 
-                if existing:
+                if existing_id:
                     if update_existing:
-                        existing.type = partner_type
-                        existing.contact_person = d.get('contact', '')
-                        existing.phone = d.get('phone', '')
-                        existing.address = d.get('address', '')
+                        update_rows.append({
+                            'id': existing_id,
+                            'type': partner_type,
+                            'contact_person': d.get('contact', ''),
+                            'phone': d.get('phone', ''),
+                            'address': d.get('address', '')
+                        })
                         success_count += 1
                     else:
                         skip_count += 1
                     continue
                 
-                partner = Partner(
-                    name=d['name'],
-                    type=partner_type,
-                    contact_person=d.get('contact', ''),
-                    phone=d.get('phone', ''),
-                    address=d.get('address', '')
-                )
-                db.session.add(partner)
+                partner_rows.append({
+                    'name': d['name'],
+                    'type': partner_type,
+                    'contact_person': d.get('contact', ''),
+                    'phone': d.get('phone', ''),
+                    'address': d.get('address', '')
+                })
                 success_count += 1
                 
             except Exception as e:
                 errors.append({'row': row, 'error': str(e), 'data': d})
         
+        # 按主键批量 UPDATE + 一条多值 INSERT
+        if update_rows:
+            db.session.execute(db.update(Partner), update_rows)
+        if partner_rows:
+            db.session.execute(db.insert(Partner), partner_rows)
+        
         db.session.commit()
         return success_count, skip_count, errors
     
@@ -243,57 +355,49 @@ class ImportService:
         skip_count = 0
         errors = []
         
-        # 缓存
-        products = {p.sku: p for p in Product.query.filter_by(is_deleted=False).all()}
-        warehouses = {w.name: w for w in Warehouse.query.filter_by(is_deleted=False).all()}
+        # SKU -> 商品 ID、仓库名 -> 仓库 ID：只取两列，且只查本批实际引用到的键
+        skus = {item['data']['sku'] for item in data}
+        warehouse_names = {item['data']['warehouse'] for item in data}
+        products = dict(db.session.execute(
+            db.select(Product.sku, Product.id).where(Product.sku.in_(skus), Product.is_deleted == False)
+        ).all()) if skus else {}
+        warehouses = dict(db.session.execute(
+            db.select(Warehouse.name, Warehouse.id).where(Warehouse.name.in_(warehouse_names), Warehouse.is_deleted == False)
+        ).all()) if warehouse_names else {}
         
+        quantities = {}
+        log_rows = []
         for item in data:
             row = item['row']
             d = item['data']
             
             try:
-                product = products.get(d['sku'])
-                if not product:
+                product_id = products.get(d['sku'])
+                if not product_id:
                     errors.append({'row': row, 'error': f"商品不存在: {d['sku']}", 'data': d})
                     continue
                 
-                warehouse = warehouses.get(d['warehouse'])
-                if not warehouse:
+                warehouse_id = warehouses.get(d['warehouse'])
+                if not warehouse_id:
                     errors.append({'row': row, 'error': f"仓库不存在: {d['warehouse']}", 'data': d})
                     continue
                 
                 quantity = int(d['quantity'])
                 
-                # 检查是否已有库存
-                stock = Stock.query.filter_by(
-                    product_id=product.id,
-                    warehouse_id=warehouse.id
-                ).first()
-                
-                if stock:
-                    old_qty = stock.quantity
-                    stock.quantity = quantity
-                else:
-                    old_qty = 0
-                    stock = Stock(
-                        product_id=product.id,
-                        warehouse_id=warehouse.id,
-                        quantity=quantity
-                    )
-                    db.session.add(stock)
+                # 同一 (商品, 仓库) 出现多次时以最后一行为准（与逐行覆盖的结果一致）
+                quantities[(product_id, warehouse_id)] = quantity
                 
                 # 库存日志
-                log = InventoryLog(
-                    transaction_code=f'IMP-{product.id}-{warehouse.id}',
-                    move_type='inbound',
-                    product_id=product.id,
-                    warehouse_id=warehouse.id,
-                    qty_change=quantity,
-                    balance_after=quantity,
-                    remark='数据导入',
-                    operator_id=user.id
-                )
-                db.session.add(log)
+                log_rows.append({
+                    'transaction_code': f'IMP-{product_id}-{warehouse_id}',
+                    'move_type': 'inbound',
+                    'product_id': product_id,
+                    'warehouse_id': warehouse_id,
+                    'qty_change': quantity,
+                    'balance_after': quantity,
+                    'remark': '数据导入',
+                    'operator_id': user.id
+                })
                 success_count += 1
                 
             except ValueError:
@@ -301,6 +405,15 @@ class ImportService:
             except Exception as e:
                 errors.append({'row': row, 'error': str(e), 'data': d})
         
+        # 库存一条多值 UPSERT，流水一条多值 INSERT，不再逐行 SELECT 后再 UPDATE/INSERT
+        if quantities:
+            Stock.set_quantities([
+                {'product_id': product_id, 'warehouse_id': warehouse_id, 'quantity': quantity}
+                for (product_id, warehouse_id), quantity in quantities.items()
+            ])
+        if log_rows:
+            db.session.execute(db.insert(InventoryLog), log_rows)
+        
         db.session.commit()
         return success_count, skip_count, errors
     
@@ -334,7 +447,8 @@ class ImportService:
                 'success_count': int,
                 'skip_count': int,
                 'error_count': int,
-                'errors': list
+                'errors': list,
+                'last_row': int      # 已提交的最后一批结束处的文件行号，中断后可从下一行续导
             }
         """
         filename = secure_filename(file.filename)
@@ -346,6 +460,9 @@ class ImportService:
                 'message': f'不支持的文件类型: {ext}'
             }
         
+        row_count = 0
+        last_row = 0
+        success = skip = 0
         try:
             content = file.read()
             
@@ -355,16 +472,44 @@ class ImportService:
             else:
                 data, headers = ImportService.parse_excel(content)
             
-            if not data:
+            importers = {
+                'product': lambda rows: ImportService.import_products(rows, user, update_existing),
+                'partner': lambda rows: ImportService.import_partners(rows, user, update_existing),
+                'stock': lambda rows: ImportService.import_stock(rows, user),
+            }
+            run_import = importers.get(template_type)
+            if run_import is None:
+                return {'success': False, 'message': f'未知的导入类型: {template_type}'}
+            
+            # 按批校验并导入（每批由导入方法提交），任意时刻只持有一批数据行；
+            # 提交后会话中的对象已过期且只被弱引用，无需 expunge 即可回收
+            rows = iter(data)
+            has_valid = False
+            validation_errors = []
+            errors = []
+            for batch in iter(lambda: list(islice(rows, ImportService.BATCH_SIZE)), []):
+                valid_rows, batch_errors = ImportService.validate_data(
+                    batch, template_type, start=2 + row_count
+                )
+                row_count += len(batch)
+                validation_errors.extend(batch_errors)
+                if not valid_rows:
+                    continue
+                
+                has_valid = True
+                batch_success, batch_skip, batch_import_errors = run_import(valid_rows)
+                success += batch_success
+                skip += batch_skip
+                errors.extend(batch_import_errors)
+                last_row = 1 + row_count
+            
+            if not row_count:
                 return {
                     'success': False,
                     'message': '文件为空或格式错误'
                 }
             
-            # 验证数据
-            valid_rows, validation_errors = ImportService.validate_data(data, template_type)
-            
-            if not valid_rows and validation_errors:
+            if not has_valid and validation_errors:
                 return {
                     'success': False,
                     'message': '数据验证失败',
@@ -372,16 +517,6 @@ class ImportService:
                     'errors': validation_errors[:20]  # 只返回前20条错误
                 }
             
-            # 执行导入
-            if template_type == 'product':
-                success, skip, errors = ImportService.import_products(valid_rows, user, update_existing)
-            elif template_type == 'partner':
-                success, skip, errors = ImportService.import_partners(valid_rows, user, update_existing)
-            elif template_type == 'stock':
-                success, skip, errors = ImportService.import_stock(valid_rows, user)
-            else:
-                return {'success': False, 'message': f'未知的导入类型: {template_type}'}
-            
             all_errors = validation_errors + errors
             
             return {
@@ -390,10 +525,21 @@ class ImportService:
                 'success_count': success,
                 'skip_count': skip,
                 'error_count': len(all_errors),
-                'errors': all_errors[:20]
+                'errors': all_errors[:20],
+                'last_row': last_row
             }
             
         except Exception as e:
+            db.session.rollback()
+            # 之前的批次已提交：告知已导入数量与中断位置，修正后可从 last_row 之后续导
+            if last_row:
+                return {
+                    'success': False,
+                    'message': f'导入在第 {last_row} 行之后中断（已导入 {success} 条）: {str(e)}',
+                    'success_count': success,
+                    'skip_count': skip,
+                    'last_row': last_row
+                }
             return {
                 'success': False,
                 'message': f'导入失败: {str(e)}'
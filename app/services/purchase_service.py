@@ -1,7 +1,7 @@
 """采购管理服务"""
 import uuid
 from datetime import datetime
-from app.extensions import db
+from app.extensions import db, cache, evict_memoized_after_commit
 from app.models.purchase import PurchaseOrder, PurchaseOrderItem, PurchasePriceHistory, SupplierPerformance
 from app.models.stock import Stock, InventoryLog, Warehouse
 from app.models.biz import Product, Partner
@@ -36,22 +36,28 @@ class PurchaseService:
             db.session.flush()
             
             total = 0.0
+            rows = []
+            history_rows = []
             for item_data in items_data:
-                item = PurchaseOrderItem(
-                    order_id=po.id,
-                    product_id=item_data['product_id'],
-                    quantity=item_data['quantity'],
-                    unit_price=item_data['unit_price']
-                )
-                db.session.add(item)
-                total += item.quantity * item.unit_price
+                rows.append({
+                    'order_id': po.id,
+                    'product_id': item_data['product_id'],
+                    'quantity': item_data['quantity'],
+                    'unit_price': item_data['unit_price']
+                })
+                total += item_data['quantity'] * item_data['unit_price']
                 
-                # 记录采购价格历史
-                PurchaseService.record_price_history(
-                    item_data['product_id'],
-                    supplier_id,
-                    item_data['unit_price']
-                )
+                # 采购价格历史
+                history_rows.append({
+                    'product_id': item_data['product_id'],
+                    'supplier_id': supplier_id,
+                    'price': item_data['unit_price']
+                })
+            
+            # 明细、价格历史各一条多值 INSERT 写入
+            if rows:
+                db.session.execute(db.insert(PurchaseOrderItem), rows)
+            PurchaseService.record_price_history(history_rows)
             
             po.total_amount = total
             db.session.commit()
@@ -109,49 +115,51 @@ class PurchaseService:
         
         try:
             all_received = True
+            log_rows = []
+            # 本单的收货明细一次 IN 查询取回，不再逐条按主键查询
+            item_ids = {data['item_id'] for data in receive_data}
+            items = {
+                item.id: item
+                for item in PurchaseOrderItem.query.filter(
+                    PurchaseOrderItem.id.in_(item_ids),
+                    PurchaseOrderItem.order_id == po_id
+                )
+            } if item_ids else {}
             for data in receive_data:
-                item = PurchaseOrderItem.query.get(data['item_id'])
-                if not item or item.order_id != po_id:
+                item = items.get(data['item_id'])
+                if not item:
                     continue
                 
                 receive_qty = min(data['receive_qty'], item.pending_qty)
                 if receive_qty <= 0:
                     continue
                 
-                item.received_qty += receive_qty
+                # 在 UPDATE 中原子累加，并发收货超收时由 received_qty <= quantity 约束拒绝
+                remaining = item.pending_qty - receive_qty
+                item.received_qty = PurchaseOrderItem.received_qty + receive_qty
                 
-                # 更新库存
-                stock = Stock.query.filter_by(
-                    product_id=item.product_id,
-                    warehouse_id=po.warehouse_id
-                ).first()
+                # 更新库存（单条 UPSERT）
+                balance = Stock.apply_delta(item.product_id, po.warehouse_id, receive_qty)
                 
-                if not stock:
-                    stock = Stock(
-                        product_id=item.product_id,
-                        warehouse_id=po.warehouse_id,
-                        quantity=0
-                    )
-                    db.session.add(stock)
+                # 记录库存流水（循环结束后一次写入）
+                log_rows.append({
+                    'transaction_code': po.po_no,
+                    'move_type': InventoryLog.TYPE_IN,
+                    'product_id': item.product_id,
+                    'warehouse_id': po.warehouse_id,
+                    'qty_change': receive_qty,
+                    'balance_after': balance,
+                    'operator_id': user.id,
+                    'remark': f"采购入库 - {po.po_no}"
+                })
                 
-                stock.quantity += receive_qty
-                
-                # 记录库存流水
-                log = InventoryLog(
-                    transaction_code=po.po_no,
-                    move_type=InventoryLog.TYPE_IN,
-                    product_id=item.product_id,
-                    warehouse_id=po.warehouse_id,
-                    qty_change=receive_qty,
-                    balance_after=stock.quantity,
-                    operator_id=user.id,
-                    remark=f"采购入库 - {po.po_no}"
-                )
-                db.session.add(log)
-                
-                if item.pending_qty > 0:
+                if remaining > 0:
                     all_received = False
             
+            # 库存流水一条多值 INSERT 写入
+            if log_rows:
+                db.session.execute(db.insert(InventoryLog), log_rows)
+            
             # 更新订单状态
             if all_received:
                 po.status = PurchaseOrder.STATUS_RECEIVED
@@ -168,48 +176,47 @@ class PurchaseService:
             return False, str(e)
     
     @staticmethod
-    def record_price_history(product_id, supplier_id, price):
-        """记录采购价格历史"""
-        history = PurchasePriceHistory(
-            product_id=product_id,
-            supplier_id=supplier_id,
-            price=price
-        )
-        db.session.add(history)
+    def record_price_history(rows):
+        """
+        记录采购价格历史（批量）
+        :param rows: [{'product_id': 1, 'supplier_id': 2, 'price': 50.0}, ...]
+        """
+        if rows:
+            db.session.execute(db.insert(PurchasePriceHistory), rows)
+            # 批量 INSERT 不触发 ORM 事件，在此登记：事务提交后失效最近采购价缓存
+            evict_memoized_after_commit(_latest_supplier_price)
     
     @staticmethod
     def update_supplier_performance(po):
         """更新供应商绩效"""
-        perf = SupplierPerformance.query.filter_by(supplier_id=po.supplier_id).first()
-        if not perf:
-            perf = SupplierPerformance(supplier_id=po.supplier_id)
-            db.session.add(perf)
-        
-        perf.total_orders += 1
-        perf.total_amount += po.total_amount
-        perf.last_order_date = datetime.utcnow()
-        
-        # 判断是否准时
+        # 判断是否准时（无预期日期默认准时）
+        on_time = True
         if po.expected_date and po.actual_receive_date:
-            if po.actual_receive_date.date() <= po.expected_date:
-                perf.on_time_orders += 1
-        else:
-            perf.on_time_orders += 1  # 无预期日期默认准时
+            on_time = po.actual_receive_date.date() <= po.expected_date
         
         # 默认质量合格
-        perf.quality_pass_orders += 1
+        SupplierPerformance.record_order(po.supplier_id, po.total_amount or 0, on_time=on_time)
     
     @staticmethod
     def get_supplier_price(product_id, supplier_id):
         """获取最近采购价格"""
-        history = PurchasePriceHistory.query.filter_by(
-            product_id=product_id,
-            supplier_id=supplier_id
-        ).order_by(PurchasePriceHistory.effective_date.desc()).first()
-        
-        if history:
-            return history.price
+        price = _latest_supplier_price(product_id, supplier_id)
+        if price is not None:
+            return price
         
         # 如果没有历史，返回产品成本价
         product = Product.query.get(product_id)
         return product.cost if product else 0
+
+
+# 短 TTL：SimpleCache 下其他 worker 的副本收不到失效，最长滞后 60 秒
+@cache.memoize(timeout=60)
+def _latest_supplier_price(product_id, supplier_id):
+    """某供应商某商品最近一次采购价，无历史时为 None（记录价格历史时失效）"""
+    return db.session.query(PurchasePriceHistory.price).filter_by(
+        product_id=product_id,
+        supplier_id=supplier_id
+    ).order_by(
+        # effective_date 只精确到日，同日多次采购以最后写入的为准
+        PurchasePriceHistory.effective_date.desc(), PurchasePriceHistory.id.desc()
+    ).limit(1).scalar()
@@ -1,16 +1,26 @@
 """报表服务 - 定时生成与订阅"""
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 from io import BytesIO
-from sqlalchemy import func, and_
-from app.extensions import db
+from sqlalchemy import func, and_, or_, case
+from app.extensions import db, cache
 from app.models.notification import ReportSubscription, GeneratedReport, Notification
 from app.models.trade import Order
 from app.models.stock import Stock, InventoryLog
 from app.models.biz import Product
 from app.models.biz import Partner
-from app.models.finance import Receivable, PaymentRecord
+
+
+# 销售类报表结果缓存时长：同一天内多个订阅者、多次生成共用一份聚合结果（缓存键含日期，跨日自动换键）
+REPORT_CACHE_TIMEOUT_DAILY = 3600
+REPORT_CACHE_TIMEOUT_WEEKLY = 6 * 3600
+REPORT_CACHE_TIMEOUT_MONTHLY = 12 * 3600
+
+
+def _day_start(day):
+    """某日 00:00 的 datetime，用于 created_at 的区间条件（不对列套 DATE()，可走索引）"""
+    return datetime.combine(day, time.min)
 
 
 class ReportService:
@@ -21,17 +31,20 @@ class ReportService:
         'sales_daily': {
             'name': '销售日报',
             'description': '每日销售汇总，包含订单数、销售额、毛利等',
-            'default_frequency': 'daily'
+            'default_frequency': 'daily',
+            'cache_timeout': REPORT_CACHE_TIMEOUT_DAILY
         },
         'sales_weekly': {
             'name': '销售周报',
             'description': '每周销售分析，包含趋势对比',
-            'default_frequency': 'weekly'
+            'default_frequency': 'weekly',
+            'cache_timeout': REPORT_CACHE_TIMEOUT_WEEKLY
         },
         'sales_monthly': {
             'name': '销售月报',
             'description': '月度销售汇总与分析',
-            'default_frequency': 'monthly'
+            'default_frequency': 'monthly',
+            'cache_timeout': REPORT_CACHE_TIMEOUT_MONTHLY
         },
         'inventory_summary': {
             'name': '库存汇总',
@@ -51,12 +64,14 @@ class ReportService:
         'customer_ranking': {
             'name': '客户排名',
             'description': '客户销售额排名',
-            'default_frequency': 'monthly'
+            'default_frequency': 'monthly',
+            'cache_timeout': REPORT_CACHE_TIMEOUT_MONTHLY
         },
         'product_ranking': {
             'name': '商品排名',
             'description': '商品销量/销售额排名',
-            'default_frequency': 'weekly'
+            'default_frequency': 'weekly',
+            'cache_timeout': REPORT_CACHE_TIMEOUT_WEEKLY
         }
     }
     
@@ -140,7 +155,7 @@ class ReportService:
                 if now.weekday() != subscription.send_weekday:
                     return False
             elif subscription.frequency == 'monthly':
-                if subscription.last_sent.month == now.month:
+                if (subscription.last_sent.year, subscription.last_sent.month) == (now.year, now.month):
                     return False
                 if now.day != subscription.send_day:
                     return False
@@ -153,6 +168,37 @@ class ReportService:
         
         return True
     
+    @staticmethod
+    def due_subscriptions(now=None):
+        """
+        查询当前应生成报表的有效订阅，判定条件与 should_generate 一致，在数据库中完成筛选：
+        到达发送小时；日报今天未发送；周报在发送星期且距上次发送满 7 天；月报在发送日期且本月未发送
+        """
+        now = now or datetime.now()
+        today_start = _day_start(now.date())
+        month_start = _day_start(now.date().replace(day=1))
+        last_sent = ReportSubscription.last_sent
+        
+        return ReportSubscription.query.filter(
+            ReportSubscription.is_active == True,
+            ReportSubscription.send_hour == now.hour,
+            or_(
+                and_(ReportSubscription.frequency == ReportSubscription.FREQUENCY_DAILY,
+                     or_(last_sent.is_(None), last_sent < today_start)),
+                and_(ReportSubscription.frequency == ReportSubscription.FREQUENCY_WEEKLY,
+                     ReportSubscription.send_weekday == now.weekday(),
+                     or_(last_sent.is_(None), last_sent <= now - timedelta(days=7))),
+                and_(ReportSubscription.frequency == ReportSubscription.FREQUENCY_MONTHLY,
+                     ReportSubscription.send_day == now.day,
+                     or_(last_sent.is_(None), last_sent < month_start)),
+                ReportSubscription.frequency.notin_([
+                    ReportSubscription.FREQUENCY_DAILY,
+                    ReportSubscription.FREQUENCY_WEEKLY,
+                    ReportSubscription.FREQUENCY_MONTHLY
+                ])
+            )
+        ).all()
+    
     @staticmethod
     def generate_report(report_type, params=None):
         """生成报表数据"""
@@ -160,33 +206,43 @@ class ReportService:
         if not generator:
             return None, f"报表生成器不存在: {report_type}"
         
+        # 配置了 cache_timeout 的报表按 (类型, 参数, 当天日期) 缓存结果
+        timeout = ReportService.REPORT_TYPES.get(report_type, {}).get('cache_timeout')
+        key = None
+        if timeout:
+            key = 'report:{}:{}:{}'.format(
+                report_type, datetime.now().date(), json.dumps(params, sort_keys=True, default=str)
+            )
+            data = cache.get(key)
+            if data is not None:
+                return data, None
+        
         try:
             data = generator(params)
-            return data, None
         except Exception as e:
             return None, str(e)
+        
+        if key:
+            cache.set(key, data, timeout=timeout)
+        return data, None
     
     @staticmethod
     def _generate_sales_daily(params):
         """生成销售日报"""
         today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        # 今日数据
-        today_stats = db.session.query(
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_amount')
-        ).filter(
-            func.date(Order.created_at) == today,
-            Order.status.in_(['paid', 'shipped', 'done'])
-        ).first()
-        
-        # 昨日数据（对比）
-        yesterday_stats = db.session.query(
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_amount')
+        today_start = _day_start(today)
+        tomorrow_start = today_start + timedelta(days=1)
+        yesterday_start = today_start - timedelta(days=1)
+        
+        # 今日数据与昨日数据（对比）：一次扫描两天的订单，按条件分别汇总
+        is_today = Order.created_at >= today_start
+        stats = db.session.query(
+            func.count(case((is_today, Order.id))).label('order_count'),
+            func.sum(case((is_today, Order.total_amount))).label('total_amount'),
+            func.sum(case((~is_today, Order.total_amount))).label('yesterday_amount')
         ).filter(
-            func.date(Order.created_at) == yesterday,
+            Order.created_at >= yesterday_start,
+            Order.created_at < tomorrow_start,
             Order.status.in_(['paid', 'shipped', 'done'])
         ).first()
         
@@ -199,20 +255,21 @@ class ReportService:
         ).join(OrderItem, OrderItem.product_id == Product.id
         ).join(Order, Order.id == OrderItem.order_id
         ).filter(
-            func.date(Order.created_at) == today,
+            Order.created_at >= today_start,
+            Order.created_at < tomorrow_start,
             Order.status.in_(['paid', 'shipped', 'done'])
         ).group_by(Product.id).order_by(func.sum(OrderItem.quantity * OrderItem.price_snapshot).desc()).limit(5).all()
         
         return {
             'report_date': str(today),
             'summary': {
-                'order_count': today_stats.order_count or 0,
-                'total_amount': float(today_stats.total_amount or 0),
-                'yesterday_amount': float(yesterday_stats.total_amount or 0),
+                'order_count': stats.order_count or 0,
+                'total_amount': float(stats.total_amount or 0),
+                'yesterday_amount': float(stats.yesterday_amount or 0),
                 'growth_rate': round(
-                    ((today_stats.total_amount or 0) - (yesterday_stats.total_amount or 1)) 
-                    / (yesterday_stats.total_amount or 1) * 100, 2
-                ) if yesterday_stats.total_amount else 0
+                    ((stats.total_amount or 0) - (stats.yesterday_amount or 1)) 
+                    / (stats.yesterday_amount or 1) * 100, 2
+                ) if stats.yesterday_amount else 0
             },
             'top_products': [
                 {'name': p.name, 'quantity': p.qty, 'amount': float(p.amount or 0)}
@@ -226,24 +283,19 @@ class ReportService:
         today = datetime.now().date()
         week_start = today - timedelta(days=today.weekday())
         last_week_start = week_start - timedelta(days=7)
-        
-        # 本周数据
-        this_week = db.session.query(
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_amount')
-        ).filter(
-            func.date(Order.created_at) >= week_start,
-            func.date(Order.created_at) <= today,
-            Order.status.in_(['paid', 'shipped', 'done'])
-        ).first()
-        
-        # 上周数据
-        last_week = db.session.query(
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_amount')
+        week_start_at = _day_start(week_start)
+        last_week_start_at = _day_start(last_week_start)
+        tomorrow_start = _day_start(today + timedelta(days=1))
+        
+        # 本周数据与上周数据：一次扫描两周的订单，按条件分别汇总
+        is_this_week = Order.created_at >= week_start_at
+        stats = db.session.query(
+            func.count(case((is_this_week, Order.id))).label('order_count'),
+            func.sum(case((is_this_week, Order.total_amount))).label('total_amount'),
+            func.sum(case((~is_this_week, Order.total_amount))).label('last_week_amount')
         ).filter(
-            func.date(Order.created_at) >= last_week_start,
-            func.date(Order.created_at) < week_start,
+            Order.created_at >= last_week_start_at,
+            Order.created_at < tomorrow_start,
             Order.status.in_(['paid', 'shipped', 'done'])
         ).first()
         
@@ -252,7 +304,7 @@ class ReportService:
             func.date(Order.created_at).label('date'),
             func.sum(Order.total_amount).label('amount')
         ).filter(
-            func.date(Order.created_at) >= week_start,
+            Order.created_at >= week_start_at,
             Order.status.in_(['paid', 'shipped', 'done'])
         ).group_by(func.date(Order.created_at)).all()
         
@@ -260,13 +312,13 @@ class ReportService:
             'week_start': str(week_start),
             'week_end': str(today),
             'summary': {
-                'order_count': this_week.order_count or 0,
-                'total_amount': float(this_week.total_amount or 0),
-                'last_week_amount': float(last_week.total_amount or 0),
+                'order_count': stats.order_count or 0,
+                'total_amount': float(stats.total_amount or 0),
+                'last_week_amount': float(stats.last_week_amount or 0),
                 'wow_growth': round(
-                    ((this_week.total_amount or 0) - (last_week.total_amount or 1)) 
-                    / (last_week.total_amount or 1) * 100, 2
-                ) if last_week.total_amount else 0
+                    ((stats.total_amount or 0) - (stats.last_week_amount or 1)) 
+                    / (stats.last_week_amount or 1) * 100, 2
+                ) if stats.last_week_amount else 0
             },
             'daily_trend': [
                 {'date': str(d.date), 'amount': float(d.amount or 0)}
@@ -288,7 +340,7 @@ class ReportService:
             func.sum(Order.total_amount).label('total_amount'),
             func.count(func.distinct(Order.customer_id)).label('customer_count')
         ).filter(
-            func.date(Order.created_at) >= month_start,
+            Order.created_at >= _day_start(month_start),
             Order.status.in_(['paid', 'shipped', 'done'])
         ).first()
         
@@ -296,8 +348,8 @@ class ReportService:
         last_month = db.session.query(
             func.sum(Order.total_amount).label('total_amount')
         ).filter(
-            func.date(Order.created_at) >= last_month_start,
-            func.date(Order.created_at) <= last_month_end,
+            Order.created_at >= _day_start(last_month_start),
+            Order.created_at < _day_start(month_start),
             Order.status.in_(['paid', 'shipped', 'done'])
         ).first()
         
@@ -321,30 +373,38 @@ class ReportService:
     @staticmethod
     def _generate_inventory_summary(params):
         """生成库存汇总"""
-        # 库存汇总
-        stocks = db.session.query(
+        # 每个商品的库存合计（子查询），计数与预警筛选都在数据库中完成，不再把全部商品取回内存
+        totals = db.session.query(
+            Product.id,
             Product.name,
             Product.sku,
             Product.min_stock,
-            func.sum(Stock.quantity).label('total_qty')
+            func.coalesce(func.sum(Stock.quantity), 0).label('total_qty')
         ).outerjoin(Stock, Stock.product_id == Product.id
         ).filter(Product.is_deleted == False
-        ).group_by(Product.id).all()
+        ).group_by(Product.id).subquery()
+        
+        is_warning = and_(totals.c.min_stock.isnot(None), totals.c.min_stock != 0,
+                          totals.c.total_qty <= totals.c.min_stock)
         
-        total_items = len(stocks)
-        warning_items = [s for s in stocks if s.min_stock and (s.total_qty or 0) <= s.min_stock]
-        zero_items = [s for s in stocks if not s.total_qty or s.total_qty == 0]
+        counts = db.session.query(
+            func.count().label('total_items'),
+            func.coalesce(func.sum(case((is_warning, 1), else_=0)), 0).label('warning_count'),
+            func.coalesce(func.sum(case((totals.c.total_qty == 0, 1), else_=0)), 0).label('zero_count')
+        ).select_from(totals).one()
+        
+        warning_items = db.session.query(totals).filter(is_warning).order_by(totals.c.id).limit(20).all()
         
         return {
             'generated_at': datetime.now().isoformat(),
             'summary': {
-                'total_products': total_items,
-                'warning_count': len(warning_items),
-                'zero_stock_count': len(zero_items)
+                'total_products': counts.total_items,
+                'warning_count': counts.warning_count,
+                'zero_stock_count': counts.zero_count
             },
             'warning_items': [
-                {'name': s.name, 'sku': s.sku, 'quantity': s.total_qty or 0, 'min_stock': s.min_stock}
-                for s in warning_items[:20]
+                {'name': s.name, 'sku': s.sku, 'quantity': s.total_qty, 'min_stock': s.min_stock}
+                for s in warning_items
             ]
         }
     
@@ -358,7 +418,8 @@ class ReportService:
             func.count(InventoryLog.id).label('count'),
             func.sum(InventoryLog.qty_change).label('total_qty')
         ).filter(
-            func.date(InventoryLog.created_at) == today
+            InventoryLog.created_at >= _day_start(today),
+            InventoryLog.created_at < _day_start(today + timedelta(days=1))
         ).group_by(InventoryLog.move_type).all()
         
         return {
@@ -372,22 +433,8 @@ class ReportService:
     @staticmethod
     def _generate_receivable_aging(params):
         """生成应收账龄"""
-        receivables = Receivable.query.filter(
-            Receivable.status.in_([Receivable.STATUS_PENDING, Receivable.STATUS_PARTIAL, Receivable.STATUS_OVERDUE])
-        ).all()
-        
-        aging = {
-            'current': {'count': 0, 'amount': 0},
-            '0-30': {'count': 0, 'amount': 0},
-            '31-60': {'count': 0, 'amount': 0},
-            '61-90': {'count': 0, 'amount': 0},
-            '90+': {'count': 0, 'amount': 0}
-        }
-        
-        for r in receivables:
-            bucket = r.age_bucket
-            aging[bucket]['count'] += 1
-            aging[bucket]['amount'] += r.unpaid_amount
+        from app.services.finance_service import FinanceService
+        aging = FinanceService.get_aging_analysis()
         
         total_amount = sum(a['amount'] for a in aging.values())
         
@@ -409,7 +456,7 @@ class ReportService:
             func.sum(Order.total_amount).label('total_amount')
         ).join(Order, Order.customer_id == Partner.id
         ).filter(
-            func.date(Order.created_at) >= month_start,
+            Order.created_at >= _day_start(month_start),
             Order.status.in_(['paid', 'shipped', 'done'])
         ).group_by(Partner.id
         ).order_by(func.sum(Order.total_amount).desc()
@@ -444,7 +491,7 @@ class ReportService:
         ).join(OrderItem, OrderItem.product_id == Product.id
         ).join(Order, Order.id == OrderItem.order_id
         ).filter(
-            func.date(Order.created_at) >= week_start,
+            Order.created_at >= _day_start(week_start),
             Order.status.in_(['paid', 'shipped', 'done'])
         ).group_by(Product.id
         ).order_by(func.sum(OrderItem.quantity * OrderItem.price_snapshot).desc()
@@ -468,48 +515,64 @@ class ReportService:
     @staticmethod
     def process_subscriptions():
         """处理所有订阅（定时任务调用）"""
-        subscriptions = ReportSubscription.query.filter_by(is_active=True).all()
+        subscriptions = ReportService.due_subscriptions()
         
-        generated_count = 0
+        now = datetime.utcnow()
+        # 本轮内相同 (报表类型, 参数) 的订阅只生成一次
+        results = {}
+        sent = []
+        report_rows = []
         
         for sub in subscriptions:
-            if not ReportService.should_generate(sub):
-                continue
-            
-            data, error = ReportService.generate_report(sub.report_type, sub.params)
+            result_key = (sub.report_type, json.dumps(sub.params, sort_keys=True, default=str))
+            if result_key not in results:
+                results[result_key] = ReportService.generate_report(sub.report_type, sub.params)
+            data, error = results[result_key]
             
             if error:
                 continue
             
             # 保存报表
-            report = GeneratedReport(
-                subscription_id=sub.id,
-                report_type=sub.report_type,
-                report_name=sub.report_name,
-                report_data=data,
-                generated_at=datetime.utcnow()
-            )
-            db.session.add(report)
-            
-            # 发送通知
-            notification = Notification(
-                user_id=sub.user_id,
-                title=f"报表已生成 - {sub.report_name}",
-                content=f"您订阅的{sub.report_name}已生成，请查看。",
-                type=Notification.TYPE_INFO,
-                category=Notification.CATEGORY_SYSTEM,
-                related_type='report',
-                related_id=report.id
-            )
-            db.session.add(notification)
-            
-            sub.last_sent = datetime.utcnow()
-            report.sent_count += 1
-            
-            generated_count += 1
+            report_rows.append({
+                'subscription_id': sub.id,
+                'report_type': sub.report_type,
+                'report_name': sub.report_name,
+                'report_data': data,
+                'generated_at': now,
+                'sent_count': 1
+            })
+            sent.append(sub)
+        
+        if not sent:
+            return 0
+        
+        # 报表、通知各一条多值 INSERT，订阅的发送时间一条 UPDATE
+        report_ids = db.session.execute(
+            db.insert(GeneratedReport).returning(GeneratedReport.id, sort_by_parameter_order=True),
+            report_rows
+        ).scalars().all()
+        
+        db.session.execute(db.insert(Notification), [
+            {
+                'user_id': sub.user_id,
+                'title': f"报表已生成 - {sub.report_name}",
+                'content': f"您订阅的{sub.report_name}已生成，请查看。",
+                'type': Notification.TYPE_INFO,
+                'category': Notification.CATEGORY_SYSTEM,
+                'related_type': 'report',
+                'related_id': report_id
+            }
+            for sub, report_id in zip(sent, report_ids)
+        ])
+        
+        db.session.execute(
+            db.update(ReportSubscription)
+            .where(ReportSubscription.id.in_([sub.id for sub in sent]))
+            .values(last_sent=now)
+        )
         
         db.session.commit()
-        return generated_count
+        return len(sent)
     
     @staticmethod
     def get_user_reports(user_id, limit=20):
@@ -528,7 +591,6 @@ class ReportService:
             ).order_by(GeneratedReport.generated_at.desc()).limit(limit).all()
         
         # 返回订阅类型的报表或用户生成的报表
-        from sqlalchemy import or_
         return GeneratedReport.query.filter(
             or_(
                 GeneratedReport.report_type.in_(subscribed_types),
@@ -29,25 +29,30 @@ class SalesService:
             db.session.add(order)
             db.session.flush() # 获取 order.id
 
-            # 3. 处理订单行并计算总价
+            # 3. 处理订单行并计算总价（商品价格一次 IN 查询取回）
+            lines = [(int(item.get('product_id')), int(item.get('quantity'))) for item in items_data]
+            prices = dict(db.session.query(Product.id, Product.price).filter(
+                Product.id.in_([pid for pid, _ in lines])
+            ).all())
+
             total = 0.0
-            for item in items_data:
-                pid = int(item.get('product_id'))
-                qty = int(item.get('quantity'))
+            rows = []
+            for pid, qty in lines:
                 if qty <= 0: continue
-
-                product = Product.query.get(pid)
-                if not product: continue
+                if pid not in prices: continue
 
                 # 锁定快照价格
-                order_item = OrderItem(
-                    order_id=order.id,
-                    product_id=product.id,
-                    quantity=qty,
-                    price_snapshot=product.price
-                )
-                db.session.add(order_item)
-                total += (product.price * qty)
+                rows.append({
+                    'order_id': order.id,
+                    'product_id': pid,
+                    'quantity': qty,
+                    'price_snapshot': prices[pid]
+                })
+                total += (prices[pid] * qty)
+
+            # 订单行一条多值 INSERT 写入
+            if rows:
+                db.session.execute(db.insert(OrderItem), rows)
 
             # 4. 更新总价
             order.total_amount = total
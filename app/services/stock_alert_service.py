@@ -18,7 +18,9 @@ class StockAlertService:
         alerts_created = 0
         
         # 获取所有产品的库存情况
-        products = Product.query.filter_by(is_deleted=False).all()
+        products = Product.query.options(
+            db.undefer(Product.total_stock)
+        ).filter_by(is_deleted=False).all()
         
         for product in products:
             total_stock = product.total_stock
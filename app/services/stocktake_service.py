@@ -73,26 +73,24 @@ class StockTakeService:
             elif take_type == StockTake.TYPE_PARTIAL and not product_ids:
                 return False, "抽盘必须指定商品"
             
-            # 创建盘点明细
-            for product_id in product_ids:
-                product = Product.query.get(product_id)
-                if not product:
-                    continue
-                
-                stock = Stock.query.filter_by(
-                    product_id=product_id, 
-                    warehouse_id=warehouse_id
-                ).first()
-                
-                system_qty = stock.quantity if stock else 0
-                
-                item = StockTakeItem(
-                    take_id=stocktake.id,
-                    product_id=product_id,
-                    system_qty=system_qty
-                )
-                db.session.add(item)
-                stocktake.total_items += 1
+            # 创建盘点明细：有效商品及其账面数量一次查询取回，明细批量 INSERT
+            system_qtys = dict(
+                db.session.query(Product.id, Stock.quantity).outerjoin(
+                    Stock,
+                    db.and_(Stock.product_id == Product.id, Stock.warehouse_id == warehouse_id)
+                ).filter(Product.id.in_(product_ids)).all()
+            )
+            rows = [
+                {'take_id': stocktake.id, 'product_id': product_id, 'system_qty': system_qtys[product_id] or 0}
+                for product_id in product_ids
+                if product_id in system_qtys
+            ]
+            if rows:
+                db.session.execute(db.insert(StockTakeItem), rows)
+            stocktake.total_items = len(rows)
+            if take_type != StockTake.TYPE_FULL and product_ids:
+                # 抽盘/循环盘点记录指定的商品范围，只保留实际存在、已生成明细的商品
+                stocktake.product_ids = [row['product_id'] for row in rows]
             
             # 记录历史
             StockTakeService.add_history(stocktake.id, 'create', user, '创建盘点单')
@@ -241,21 +239,7 @@ class StockTakeService:
     @staticmethod
     def adjust_stock(stocktake, item, user):
         """根据盘点结果调整库存"""
-        stock = Stock.query.filter_by(
-            product_id=item.product_id,
-            warehouse_id=stocktake.warehouse_id
-        ).first()
-        
-        if not stock:
-            stock = Stock(
-                product_id=item.product_id,
-                warehouse_id=stocktake.warehouse_id,
-                quantity=0
-            )
-            db.session.add(stock)
-        
-        old_qty = stock.quantity
-        stock.quantity = item.actual_qty
+        Stock.set_quantity(item.product_id, stocktake.warehouse_id, item.actual_qty)
         
         # 创建库存日志
         log_type = 'check'  # 盘点调整
@@ -301,18 +285,26 @@ class StockTakeService:
     @staticmethod
     def get_variance_summary(stocktake_id):
         """获取差异汇总"""
-        items = StockTakeItem.query.filter_by(take_id=stocktake_id).all()
-        
-        summary = {
-            'total_items': len(items),
-            'counted_items': sum(1 for i in items if i.actual_qty is not None),
-            'variance_items': sum(1 for i in items if i.variance_qty != 0),
-            'surplus_items': sum(1 for i in items if i.variance_type == 'surplus'),
-            'loss_items': sum(1 for i in items if i.variance_type == 'loss'),
-            'total_surplus_qty': sum(i.variance_qty for i in items if i.variance_type == 'surplus'),
-            'total_loss_qty': sum(abs(i.variance_qty) for i in items if i.variance_type == 'loss'),
-            'total_surplus_value': sum(i.variance_value for i in items if i.variance_type == 'surplus'),
-            'total_loss_value': sum(abs(i.variance_value) for i in items if i.variance_type == 'loss')
-        }
+        # 一次聚合查询按差异类型条件求和，不再逐行加载 ORM 对象在 Python 侧分支累加
+        qty = StockTakeItem.variance_qty
+        value = StockTakeItem.variance_value
+        vtype = StockTakeItem.variance_type
+
+        def total(expr, when):
+            return func.coalesce(func.sum(db.case((when, expr), else_=0)), 0)
+
+        row = db.session.query(
+            func.count(StockTakeItem.id).label('total_items'),
+            func.count(StockTakeItem.actual_qty).label('counted_items'),
+            total(1, qty != 0).label('variance_items'),
+            total(1, vtype == 'surplus').label('surplus_items'),
+            total(1, vtype == 'loss').label('loss_items'),
+            total(qty, vtype == 'surplus').label('total_surplus_qty'),
+            total(-qty, vtype == 'loss').label('total_loss_qty'),
+            total(value, vtype == 'surplus').label('total_surplus_value'),
+            total(-value, vtype == 'loss').label('total_loss_value'),
+        ).filter(StockTakeItem.take_id == stocktake_id).one()
+
+        summary = row._asdict()
         
         return summary
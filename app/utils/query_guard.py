@@ -0,0 +1,30 @@
+"""
+N+1 查询检测工具模块
+开发/测试环境接入 nplusone：请求中触发懒加载（或预加载了却没用到）时记录日志，
+NPLUSONE_RAISE 为真时直接抛出 NPlusOneError，让回归在本地和测试中立刻暴露
+"""
+import logging
+
+
+def init_query_guard(app):
+    """按配置启用 nplusone（可选依赖，未安装时仅提示）"""
+    if not app.config.get('NPLUSONE_ENABLED'):
+        return
+
+    # nplusone 1.0 (2018) 通过替换 sqlalchemy.orm.loading.instances(query, cursor, context) 等内部函数挂钩，
+    # SQLAlchemy 1.4 起这些签名已变，挂上后检测不到懒加载甚至在查询时报错，这里直接拒绝启用
+    import sqlalchemy
+    if tuple(int(part) for part in sqlalchemy.__version__.split('.')[:2]) >= (1, 4):
+        app.logger.warning('⚠️ nplusone 不支持 SQLAlchemy %s，N+1 查询检测未启用', sqlalchemy.__version__)
+        return
+
+    try:
+        from nplusone.ext.flask_sqlalchemy import NPlusOne
+    except ImportError:
+        app.logger.warning('⚠️ nplusone 包未安装，N+1 查询检测不可用')
+        return
+
+    app.config.setdefault('NPLUSONE_LOGGER', logging.getLogger('nplusone'))
+    app.config.setdefault('NPLUSONE_LOG_LEVEL', logging.WARNING)
+    NPlusOne(app)
+    app.logger.info('✅ nplusone N+1 查询检测已启用')
@@ -18,6 +18,8 @@ class Config:
     DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
     # 如果未配置外部 AI Key，可启用本地回退模式（返回简单回应或使用内置分析）
     AI_FALLBACK = os.environ.get('AI_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+    # 对话历史的 token 预算：超出时整条丢弃最早的消息，保持发送给模型的前缀稳定
+    AI_CONTEXT_TOKEN_BUDGET = int(os.environ.get('AI_CONTEXT_TOKEN_BUDGET', 6000))
     
     # 文件上传配置
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads')
@@ -33,8 +35,10 @@ class Config:
     # 是否启用云存储（生产环境自动启用，如果配置了 Cloudinary）
     USE_CLOUD_STORAGE = os.environ.get('USE_CLOUD_STORAGE', 'auto').lower()
     
-    # 缓存配置 (默认使用 SimpleCache，生产环境可改 Redis)
-    CACHE_TYPE = "SimpleCache"
+    # 缓存配置：默认 SimpleCache 为进程内缓存，多个 gunicorn worker 各持一份，失效只作用于当前进程；
+    # 生产环境设 CACHE_TYPE=RedisCache 并配置 REDIS_URL，失效才对所有 worker 生效
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL')
     CACHE_DEFAULT_TIMEOUT = 300
 
     @staticmethod
@@ -54,8 +58,24 @@ class Config:
 class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'nexus_prime.db')
+    
+    # N+1 查询检测 (需安装 nplusone，且仅支持 SQLAlchemy < 1.4)：默认只记日志，NPLUSONE_RAISE=true 时懒加载即抛 NPlusOneError
+    NPLUSONE_ENABLED = os.environ.get('NPLUSONE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    NPLUSONE_RAISE = os.environ.get('NPLUSONE_RAISE', 'false').lower() in ('1', 'true', 'yes')
+    # 已确认无害的懒加载，例: [{'model': 'Product', 'field': 'category'}]
+    NPLUSONE_WHITELIST = []
+    
+    @classmethod
+    def init_app(cls, app):
+        Config.init_app(app)
+        from app.utils.query_guard import init_query_guard
+        init_query_guard(app)
 
 class ProductionConfig(Config):
     """生产环境配置"""
@@ -70,6 +90,18 @@ class ProductionConfig(Config):
     
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     
+    # 连接池配置：LIFO 复用热连接，pre_ping 剔除被服务端断开的连接
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 40)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'pool_use_lifo': True,
+    }
+    if DATABASE_URL.startswith('postgresql'):
+        # 单条语句超时 30 秒，防止慢查询长期占用连接
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {'options': '-c statement_timeout=30000'}
+    
     # 安全设置
     SESSION_COOKIE_SECURE = False  # Railway 会处理 HTTPS
     SESSION_COOKIE_HTTPONLY = True
@@ -109,6 +141,16 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     WTF_CSRF_ENABLED = False
+    # 启用检测时，测试中触发懒加载的端点直接失败
+    NPLUSONE_ENABLED = os.environ.get('NPLUSONE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    NPLUSONE_RAISE = True
+    NPLUSONE_WHITELIST = []
+    
+    @classmethod
+    def init_app(cls, app):
+        Config.init_app(app)
+        from app.utils.query_guard import init_query_guard
+        init_query_guard(app)
 
 config = {
     'development': DevelopmentConfig,
@@ -97,6 +97,13 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # SQLite 的 batch 迁移会重建表（建新表、拷数据、删旧表），
+        # 期间须关闭外键检查，否则删旧表会触发外键校验或 ON DELETE CASCADE 清掉明细行
+        sqlite = connection.dialect.name == 'sqlite'
+        if sqlite:
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -106,6 +113,10 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+        if sqlite:
+            connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+            connection.commit()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
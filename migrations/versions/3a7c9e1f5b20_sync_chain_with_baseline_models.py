@@ -0,0 +1,95 @@
+"""Sync migration chain with models built by create_all
+
+Revision ID: 3a7c9e1f5b20
+Revises: 65cf96d20fca
+Create Date: 2026-10-16 15:30:00.000000
+
+迁移链此前落后于模型：AI 对话表和若干字段只经 db.create_all() 建出。
+已用 create_all 建表的库执行 `flask db stamp 65cf96d20fca` 后再 `flask db upgrade`，
+本修订只补缺失的表和字段，已存在的跳过。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7c9e1f5b20'
+down_revision = '65cf96d20fca'
+branch_labels = None
+depends_on = None
+
+
+# (表, 字段) -> 列定义
+MISSING_COLUMNS = [
+    ('auth_users', lambda: sa.Column('failed_login_attempts', sa.Integer(), nullable=True)),
+    ('auth_users', lambda: sa.Column('locked_until', sa.DateTime(), nullable=True)),
+    ('auth_users', lambda: sa.Column('last_password_change', sa.DateTime(), nullable=True)),
+    ('biz_products', lambda: sa.Column('min_stock', sa.Integer(), nullable=True)),
+    ('biz_products', lambda: sa.Column('max_stock', sa.Integer(), nullable=True)),
+    ('cms_articles', lambda: sa.Column('category', sa.String(length=32), nullable=True)),
+    ('report_subscriptions', lambda: sa.Column('report_name', sa.String(length=128), nullable=True)),
+    ('report_subscriptions', lambda: sa.Column('params', sa.JSON(), nullable=True)),
+    ('report_subscriptions', lambda: sa.Column('last_sent', sa.DateTime(), nullable=True)),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'sys_ai_sessions' not in tables:
+        op.create_table('sys_ai_sessions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=128), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('is_archived', sa.Boolean(), nullable=True),
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['auth_users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('sys_ai_sessions', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_sys_ai_sessions_created_at'), ['created_at'], unique=False)
+            batch_op.create_index(batch_op.f('ix_sys_ai_sessions_is_deleted'), ['is_deleted'], unique=False)
+            batch_op.create_index(batch_op.f('ix_sys_ai_sessions_user_id'), ['user_id'], unique=False)
+
+    if 'sys_ai_messages' not in tables:
+        op.create_table('sys_ai_messages',
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=16), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('tokens', sa.Integer(), nullable=True),
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('is_deleted', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['sys_ai_sessions.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('sys_ai_messages', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_sys_ai_messages_created_at'), ['created_at'], unique=False)
+            batch_op.create_index(batch_op.f('ix_sys_ai_messages_is_deleted'), ['is_deleted'], unique=False)
+            batch_op.create_index(batch_op.f('ix_sys_ai_messages_session_id'), ['session_id'], unique=False)
+
+    existing = {}
+    for table, make_column in MISSING_COLUMNS:
+        if table not in existing:
+            existing[table] = {c['name'] for c in inspector.get_columns(table)}
+        column = make_column()
+        if column.name not in existing[table]:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.add_column(column)
+
+    if 'subscription_id' not in {c['name'] for c in inspector.get_columns('generated_reports')}:
+        with op.batch_alter_table('generated_reports', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('subscription_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_generated_reports_subscription_id_report_subscriptions',
+                                        'report_subscriptions', ['subscription_id'], ['id'])
+
+
+def downgrade():
+    # 这些表和字段可能早于本修订就已由 create_all 建出，降级时不删除
+    pass
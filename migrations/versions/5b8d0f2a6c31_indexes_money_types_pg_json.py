@@ -0,0 +1,160 @@
+"""Composite indexes, NUMERIC money, BIGINT log quantities, PostgreSQL JSONB/ARRAY
+
+Revision ID: 5b8d0f2a6c31
+Revises: 3a7c9e1f5b20
+Create Date: 2026-10-16 15:40:00.000000
+
+- 热点筛选的复合索引，替换被覆盖的单列索引
+- 金额列 FLOAT -> NUMERIC(18,4)，库存流水数量 INTEGER -> BIGINT，应收已收金额范围约束
+- PostgreSQL：流水 created_at 的 BRIN 索引；报表数据 JSON -> JSONB + GIN；
+  盘点范围 JSON -> INTEGER[] + GIN；批量导入用到的外键改为 DEFERRABLE INITIALLY IMMEDIATE
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d0f2a6c31'
+down_revision = '3a7c9e1f5b20'
+branch_labels = None
+depends_on = None
+
+
+MONEY = sa.Numeric(precision=18, scale=4)
+
+MONEY_COLUMNS = {
+    'finance_customer_credit': ['credit_limit', 'used_credit'],
+    'finance_payments': ['amount'],
+    'finance_receivables': ['total_amount', 'paid_amount'],
+    'finance_statements': ['opening_balance', 'sales_amount', 'payment_amount', 'closing_balance'],
+    'purchase_orders': ['total_amount'],
+    'purchase_order_items': ['unit_price'],
+    'purchase_price_history': ['price'],
+    'supplier_performance': ['total_amount'],
+    'trade_orders': ['total_amount'],
+    'trade_order_items': ['price_snapshot'],
+    'stock_take_items': ['unit_cost'],
+}
+
+# (表, [(新索引, 列)], 被替换的单列索引)
+INDEXES = [
+    ('biz_partners', [('ix_biz_partners_type_is_deleted', ['type', 'is_deleted'])], 'ix_biz_partners_type'),
+    ('trade_orders', [('ix_trade_orders_status_created_at', ['status', 'created_at'])], 'ix_trade_orders_status'),
+    ('stock_logs', [('ix_stock_logs_product_id_created_at', ['product_id', 'created_at'])], None),
+    ('finance_receivables', [
+        ('ix_finance_receivables_status_due_date', ['status', 'due_date']),
+        ('ix_finance_receivables_customer_id_status', ['customer_id', 'status']),
+    ], 'ix_finance_receivables_status'),
+    ('purchase_orders', [('ix_purchase_orders_supplier_id_status', ['supplier_id', 'status'])], None),
+    ('sys_notifications', [
+        ('ix_sys_notifications_user_id_is_read_created_at', ['user_id', 'is_read', 'created_at']),
+        ('ix_sys_notifications_user_id_created_at', ['user_id', 'created_at']),
+    ], 'ix_sys_notifications_user_id'),
+]
+
+# PostgreSQL 上改为可延迟检查的外键（约束名为 PostgreSQL 默认的 <表>_<列>_fkey）。
+# SQLite 没有 SET CONSTRAINTS，INITIALLY IMMEDIATE 与原约束行为一致，不为此重建表
+DEFERRABLE_FKS = [
+    ('biz_product_tags', 'product_id'),
+    ('biz_product_tags', 'tag_id'),
+    ('biz_products', 'category_id'),
+    ('biz_products', 'supplier_id'),
+    ('stock_quantities', 'product_id'),
+    ('stock_quantities', 'warehouse_id'),
+    ('stock_logs', 'product_id'),
+    ('stock_logs', 'warehouse_id'),
+    ('stock_logs', 'operator_id'),
+    ('trade_orders', 'customer_id'),
+    ('trade_orders', 'seller_id'),
+    ('trade_order_items', 'order_id'),
+    ('trade_order_items', 'product_id'),
+]
+
+STOCK_TAKE_ID_LISTS = ['category_ids', 'product_ids']
+
+
+def upgrade():
+    is_pg = op.get_bind().dialect.name == 'postgresql'
+
+    for table, indexes, replaced in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if replaced:
+                batch_op.drop_index(replaced)
+            for name, columns in indexes:
+                batch_op.create_index(name, columns, unique=False)
+
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.Float(), type_=MONEY)
+            if table == 'finance_receivables':
+                batch_op.create_check_constraint('ck_finance_receivables_paid_range',
+                                                 'paid_amount >= 0 AND paid_amount <= total_amount')
+
+    with op.batch_alter_table('stock_logs', schema=None) as batch_op:
+        batch_op.alter_column('qty_change', existing_type=sa.Integer(), type_=sa.BigInteger())
+        batch_op.alter_column('balance_after', existing_type=sa.Integer(), type_=sa.BigInteger())
+
+    if not is_pg:
+        return
+
+    op.create_index('ix_stock_logs_created_at_brin', 'stock_logs', ['created_at'], postgresql_using='brin')
+
+    op.alter_column('generated_reports', 'report_data', existing_type=sa.JSON(),
+                    type_=postgresql.JSONB(), postgresql_using='report_data::jsonb')
+    op.create_index('ix_generated_reports_report_data', 'generated_reports', ['report_data'],
+                    postgresql_using='gin')
+
+    # JSON 数组 -> INTEGER[]：USING 子句不能含子查询，借临时列转换
+    for column in STOCK_TAKE_ID_LISTS:
+        op.add_column('stock_takes', sa.Column(f'{column}_new', postgresql.ARRAY(sa.Integer())))
+        op.execute(
+            f"UPDATE stock_takes SET {column}_new = "
+            f"ARRAY(SELECT json_array_elements_text({column})::integer) "
+            f"WHERE json_typeof({column}) = 'array'"
+        )
+        op.drop_column('stock_takes', column)
+        op.alter_column('stock_takes', f'{column}_new', new_column_name=column)
+    op.create_index('ix_stock_takes_product_ids', 'stock_takes', ['product_ids'], postgresql_using='gin')
+
+    for table, column in DEFERRABLE_FKS:
+        op.execute(f'ALTER TABLE {table} ALTER CONSTRAINT {table}_{column}_fkey DEFERRABLE INITIALLY IMMEDIATE')
+
+
+def downgrade():
+    is_pg = op.get_bind().dialect.name == 'postgresql'
+
+    if is_pg:
+        for table, column in DEFERRABLE_FKS:
+            op.execute(f'ALTER TABLE {table} ALTER CONSTRAINT {table}_{column}_fkey NOT DEFERRABLE')
+
+        op.drop_index('ix_stock_takes_product_ids', table_name='stock_takes')
+        for column in STOCK_TAKE_ID_LISTS:
+            op.alter_column('stock_takes', column, existing_type=postgresql.ARRAY(sa.Integer()),
+                            type_=sa.JSON(), postgresql_using=f'to_json({column})')
+
+        op.drop_index('ix_generated_reports_report_data', table_name='generated_reports')
+        op.alter_column('generated_reports', 'report_data', existing_type=postgresql.JSONB(),
+                        type_=sa.JSON(), postgresql_using='report_data::json')
+
+        op.drop_index('ix_stock_logs_created_at_brin', table_name='stock_logs')
+
+    with op.batch_alter_table('stock_logs', schema=None) as batch_op:
+        batch_op.alter_column('balance_after', existing_type=sa.BigInteger(), type_=sa.Integer())
+        batch_op.alter_column('qty_change', existing_type=sa.BigInteger(), type_=sa.Integer())
+
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if table == 'finance_receivables':
+                batch_op.drop_constraint('ck_finance_receivables_paid_range', type_='check')
+            for column in columns:
+                batch_op.alter_column(column, existing_type=MONEY, type_=sa.Float())
+
+    for table, indexes, replaced in reversed(INDEXES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, columns in indexes:
+                batch_op.drop_index(name)
+            if replaced:
+                batch_op.create_index(replaced, [replaced[len(table) + 4:]], unique=False)
@@ -0,0 +1,43 @@
+"""Unique stock row per (product, warehouse)
+
+Revision ID: 6c9e1a3b7d42
+Revises: 5b8d0f2a6c31
+Create Date: 2026-10-16 16:05:00.000000
+
+Stock.apply_delta 以该唯一约束作为 ON CONFLICT 的冲突目标。
+旧库允许同一 (产品, 仓库) 出现多行，建约束前先把重复行的数量合并到 id 最小的一行。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c9e1a3b7d42'
+down_revision = '5b8d0f2a6c31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "UPDATE stock_quantities SET quantity = ("
+        "SELECT SUM(COALESCE(s.quantity, 0)) FROM stock_quantities s "
+        "WHERE s.product_id = stock_quantities.product_id "
+        "AND s.warehouse_id = stock_quantities.warehouse_id) "
+        "WHERE id IN ("
+        "SELECT MIN(id) FROM stock_quantities GROUP BY product_id, warehouse_id HAVING COUNT(*) > 1)"
+    )
+    op.execute(
+        "DELETE FROM stock_quantities WHERE id NOT IN ("
+        "SELECT MIN(id) FROM stock_quantities GROUP BY product_id, warehouse_id)"
+    )
+
+    with op.batch_alter_table('stock_quantities', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_stock_quantities_product_id_warehouse_id',
+                                          ['product_id', 'warehouse_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('stock_quantities', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_stock_quantities_product_id_warehouse_id', type_='unique')
@@ -0,0 +1,28 @@
+"""Optimistic lock version on customer credit
+
+Revision ID: 7d0f2b4c8e53
+Revises: 6c9e1a3b7d42
+Create Date: 2026-10-16 16:20:00.000000
+
+CustomerCredit 以 version 作为 version_id_col，已有行由 server_default 填为 1。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d0f2b4c8e53'
+down_revision = '6c9e1a3b7d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('finance_customer_credit', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('finance_customer_credit', schema=None) as batch_op:
+        batch_op.drop_column('version')
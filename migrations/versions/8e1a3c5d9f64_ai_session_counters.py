@@ -0,0 +1,37 @@
+"""Denormalised AI session counters
+
+Revision ID: 8e1a3c5d9f64
+Revises: 7d0f2b4c8e53
+Create Date: 2026-10-16 16:30:00.000000
+
+会话上的冗余计数由 AiChatMessage 的插入/删除事件维护，已有会话按消息表回填一次。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1a3c5d9f64'
+down_revision = '7d0f2b4c8e53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sys_ai_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('total_tokens', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE sys_ai_sessions SET message_count = ("
+        "SELECT count(*) FROM sys_ai_messages WHERE session_id = sys_ai_sessions.id), "
+        "total_tokens = ("
+        "SELECT COALESCE(SUM(tokens), 0) FROM sys_ai_messages WHERE session_id = sys_ai_sessions.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('sys_ai_sessions', schema=None) as batch_op:
+        batch_op.drop_column('total_tokens')
+        batch_op.drop_column('message_count')
@@ -0,0 +1,47 @@
+"""Stored generated columns: receivable unpaid_amount, purchase item pending_qty
+
+Revision ID: 9f2b4d6e0a75
+Revises: 8e1a3c5d9f64
+Create Date: 2026-10-16 16:45:00.000000
+
+SQLite 的 ALTER TABLE ADD COLUMN 不支持 STORED 生成列，需 batch 重建表；
+PostgreSQL 12+ 可直接 ADD COLUMN ... GENERATED ALWAYS AS (...) STORED。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f2b4d6e0a75'
+down_revision = '8e1a3c5d9f64'
+branch_labels = None
+depends_on = None
+
+
+def _recreate():
+    return 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+
+
+def upgrade():
+    recreate = _recreate()
+
+    with op.batch_alter_table('finance_receivables', schema=None, recreate=recreate) as batch_op:
+        batch_op.add_column(sa.Column('unpaid_amount', sa.Numeric(precision=18, scale=4),
+                                      sa.Computed('total_amount - paid_amount', persisted=True)))
+        batch_op.create_index('ix_finance_receivables_unpaid_amount', ['unpaid_amount'], unique=False)
+
+    with op.batch_alter_table('purchase_order_items', schema=None, recreate=recreate) as batch_op:
+        batch_op.add_column(sa.Column('pending_qty', sa.Integer(),
+                                      sa.Computed('quantity - received_qty', persisted=True)))
+
+
+def downgrade():
+    recreate = _recreate()
+
+    with op.batch_alter_table('purchase_order_items', schema=None, recreate=recreate) as batch_op:
+        batch_op.drop_column('pending_qty')
+
+    with op.batch_alter_table('finance_receivables', schema=None, recreate=recreate) as batch_op:
+        batch_op.drop_index('ix_finance_receivables_unpaid_amount')
+        batch_op.drop_column('unpaid_amount')
@@ -0,0 +1,60 @@
+"""ON DELETE CASCADE on detail-row foreign keys
+
+Revision ID: a03c5e7f1b86
+Revises: 9f2b4d6e0a75
+Create Date: 2026-10-16 17:00:00.000000
+
+明细表外键改为 ON DELETE CASCADE，删除主单时由数据库删除明细，ORM 侧 passive_deletes 不再逐行加载。
+SQLite 的外键没有名字，batch 重建时按 naming_convention 命名后再替换；
+PostgreSQL 的约束名即默认的 <表>_<列>_fkey。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a03c5e7f1b86'
+down_revision = '9f2b4d6e0a75'
+branch_labels = None
+depends_on = None
+
+
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# (明细表, 外键列, 主表, 额外的外键选项)
+CASCADE_FKS = [
+    ('finance_payments', 'receivable_id', 'finance_receivables', {}),
+    ('purchase_order_items', 'order_id', 'purchase_orders', {}),
+    ('stock_take_items', 'take_id', 'stock_takes', {}),
+    ('sys_ai_messages', 'session_id', 'sys_ai_sessions', {}),
+    ('trade_order_items', 'order_id', 'trade_orders', {'deferrable': True, 'initially': 'IMMEDIATE'}),
+]
+
+# batch 重建会把旧表所有列 INSERT 进新表，而 SQLite 不允许写入生成列；
+# 重建时先删掉生成列再加回，由新表重新计算
+GENERATED_COLUMNS = {
+    'purchase_order_items': lambda: sa.Column('pending_qty', sa.Integer(),
+                                              sa.Computed('quantity - received_qty', persisted=True)),
+}
+
+
+def _replace_foreign_keys(ondelete):
+    is_sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table, column, referent, options in CASCADE_FKS:
+        name = f'{table}_{column}_fkey'
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referent, [column], ['id'], ondelete=ondelete, **options)
+            if is_sqlite and table in GENERATED_COLUMNS:
+                generated = GENERATED_COLUMNS[table]()
+                batch_op.drop_column(generated.name)
+                batch_op.add_column(generated)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
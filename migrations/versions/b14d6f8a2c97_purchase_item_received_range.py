@@ -0,0 +1,42 @@
+"""Check received quantity range on purchase order items
+
+Revision ID: b14d6f8a2c97
+Revises: a03c5e7f1b86
+Create Date: 2026-10-16 17:15:00.000000
+
+收货以条件 UPDATE 原子累加 received_qty，数据库约束兜底保证 0 <= received_qty <= quantity。
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b14d6f8a2c97'
+down_revision = 'a03c5e7f1b86'
+branch_labels = None
+depends_on = None
+
+
+def _pending_qty():
+    return sa.Column('pending_qty', sa.Integer(), sa.Computed('quantity - received_qty', persisted=True))
+
+
+def upgrade():
+    is_sqlite = op.get_bind().dialect.name == 'sqlite'
+    with op.batch_alter_table('purchase_order_items', schema=None) as batch_op:
+        batch_op.create_check_constraint('ck_purchase_order_items_received_range',
+                                         'received_qty >= 0 AND received_qty <= quantity')
+        if is_sqlite:
+            # SQLite 重建表时不能向生成列写入，删掉再加回由新表重新计算
+            batch_op.drop_column('pending_qty')
+            batch_op.add_column(_pending_qty())
+
+
+def downgrade():
+    is_sqlite = op.get_bind().dialect.name == 'sqlite'
+    with op.batch_alter_table('purchase_order_items', schema=None) as batch_op:
+        batch_op.drop_constraint('ck_purchase_order_items_received_range', type_='check')
+        if is_sqlite:
+            batch_op.drop_column('pending_qty')
+            batch_op.add_column(_pending_qty())
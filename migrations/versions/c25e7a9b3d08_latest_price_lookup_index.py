@@ -0,0 +1,27 @@
+"""Index the latest supplier price lookup
+
+Revision ID: c25e7a9b3d08
+Revises: b14d6f8a2c97
+Create Date: 2026-10-16 17:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c25e7a9b3d08'
+down_revision = 'b14d6f8a2c97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('purchase_price_history', schema=None) as batch_op:
+        batch_op.create_index('ix_purchase_price_history_product_id_supplier_id_effective_date',
+                              ['product_id', 'supplier_id', 'effective_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('purchase_price_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_purchase_price_history_product_id_supplier_id_effective_date')
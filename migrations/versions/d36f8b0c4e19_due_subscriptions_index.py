@@ -0,0 +1,27 @@
+"""Index due report subscription selection
+
+Revision ID: d36f8b0c4e19
+Revises: c25e7a9b3d08
+Create Date: 2026-10-16 17:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd36f8b0c4e19'
+down_revision = 'c25e7a9b3d08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report_subscriptions', schema=None) as batch_op:
+        batch_op.create_index('ix_report_subscriptions_is_active_send_hour_frequency',
+                              ['is_active', 'send_hour', 'frequency'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_subscriptions', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_subscriptions_is_active_send_hour_frequency')